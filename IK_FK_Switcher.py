@@ -7,18 +7,29 @@ Version - 1.0
 Description - Tool that allows you to build a temporary IK/FK setup on any rig, while preserving animation. Example - You select the controls for you arm FK chain (Shoulder, Elbow, Wrist), 
 and then click the "FK to IK" button to apply an IK setup on top of your original FK controls. You can also isolate the code from the UI so you can put it into a marking menu or on the shelf.
 
+Running the script in the Script Editor opens the window. Importing it has no side effects, so for a shelf button or marking menu, put the script in your scripts folder and use:
+    import IK_FK_Switcher
+    IK_FK_Switcher.userInterface()
+Python keeps the imported module cached, so after the first launch the window opens straight away.
+
 """
 
 import maya.cmds as cmds
-import maya.OpenMaya as om
 from sys import exit
+from time import perf_counter
+import array
+import base64
+import math
+import struct
+import zlib
 
 
 ##################################################################################################################################################################################################################
 
-def filterCurve_staticChannels(control):
-#APPLIES A EULER FILTER AND REMOVES STATIC CHANNELS    
+def filterCurve_staticChannels(control, chain=()):
+#APPLIES A EULER FILTER AND REMOVES STATIC CHANNELS. THE chain IS ONLY NEEDED BY THE AUTO KEY REDUCER, TO KNOW HOW FAR THE CONTROL'S ROTATIONS CARRY
     refApplyKeyReducer = cmds.checkBoxGrp("ApplyKeyReducer_CheckBox", q=True, v1=True)
+    refAutoKeyReducer = cmds.checkBoxGrp("AutoKeyReducer_CheckBox", q=True, v1=True)
     refKeyReducerIntensity = cmds.floatFieldGrp("Intensity_FloatField", q=True, v1=True)
     refRemoveStaticChannels = cmds.checkBoxGrp("RemoveStaticChannels_CheckBox", q=True, v1=True)
     cmds.select(control)
@@ -26,12 +37,72 @@ def filterCurve_staticChannels(control):
         cmds.delete(staticChannels=True, hi="none", cp=False, s=False)    
     cmds.select(control)
     cmds.filterCurve()
-    if refApplyKeyReducer:
+    if refApplyKeyReducer and refAutoKeyReducer:
+        reduceKeys(control, chain)
+    elif refApplyKeyReducer:
         cmds.filterCurve(f="keyReducer", pm=1, pre=refKeyReducerIntensity)
 
+def distance(a, b):
+#DISTANCE BETWEEN TWO POINTS
+    return math.sqrt(sum((valueA - valueB) ** 2 for valueA, valueB in zip(a, b)))
+
+def leverLength(control, chain):
+#HOW FAR A ROTATION ON THE CONTROL CARRIES: THE DISTANCE TO THE FURTHEST CHAIN MEMBER BELOW IT, BUT NEVER LESS THAN AN AVERAGE SEGMENT OF THE CHAIN
+    positions = [cmds.xform(node, q=True, ws=True, t=True) for node in chain]
+    if len(positions) < 2:
+        return 1.0
+    segment = sum(distance(a, b) for a, b in zip(positions, positions[1:])) / (len(positions) - 1)
+    controlPosition = cmds.xform(control, q=True, ws=True, t=True)
+    below = positions[list(chain).index(control) + 1:] if control in chain else []
+    return max([segment] + [distance(controlPosition, position) for position in below]) or 1.0
+
+def reducedCurveError(curve, times, values, precision):
+#RUNS THE KEY REDUCER ON A COPY OF THE CURVE AND RETURNS THE LARGEST DIFFERENCE FROM THE BAKED VALUES. ONLY THE CURVE IS EVALUATED, NOT THE SCENE,
+#AND ALL THE BAKED TIMES GO IN ONE keyframe CALL
+    copy = cmds.duplicate(curve)[0]
+    cmds.filterCurve(copy, f="keyReducer", pm=1, pre=precision)
+    reduced = cmds.keyframe(copy, q=True, eval=True, t=[(time, time) for time in times])
+    error = max(abs(reducedValue - value) for reducedValue, value in zip(reduced, values))
+    cmds.delete(copy)
+    return error
+
+def reduceKeys(control, chain=()):
+#AUTO KEY REDUCER. THE ERROR BUDGET IS A DISTANCE IN SCENE UNITS, SPLIT EVENLY ACROSS THE ANIMATED CHANNELS OF THE CONTROL. ROTATION AND SCALE SHARES ARE CONVERTED OVER THE LEVER LENGTH.
+#FOR EVERY CHANNEL, THE PRECISION IS BISECTED ON A COPY OF THE CURVE, AND THE STRONGEST ONE THAT STAYS WITHIN BUDGET IS APPLIED TO THE REAL CURVE
+    refErrorBudget = cmds.floatFieldGrp("ErrorBudget_FloatField", q=True, v1=True)
+    curves = cmds.keyframe(control, q=True, name=True) or []
+    if not curves:
+        return
+    lever = leverLength(control, chain)
+    for curve in curves:
+        budget = refErrorBudget / len(curves)
+        attribute = (cmds.listConnections(curve + ".output", s=False, d=True, plugs=True) or [""])[0].split(".")[-1]
+        if cmds.nodeType(curve) == "animCurveTA":
+            budget = math.degrees(budget / lever)
+        elif attribute.startswith("scale"):
+            budget = budget / lever
+        times = cmds.keyframe(curve, q=True, tc=True)
+        values = array.array("d", cmds.keyframe(curve, q=True, vc=True))
+        if len(times) < 3:
+            continue
+            
+        #DOUBLES THE PRECISION UNTIL IT GOES OVER BUDGET, THEN BISECTS BETWEEN THE LAST ONE THAT PASSED AND THE FIRST ONE THAT DIDN'T
+        best, low, high = 0.0, 0.0, 1.0
+        while high <= 64 and reducedCurveError(curve, times, values, high) <= budget:
+            best, low, high = high, high, high * 2
+        if high <= 64:
+            for i in range(6):
+                middle = (low + high) / 2
+                if reducedCurveError(curve, times, values, middle) <= budget:
+                    best, low = middle, middle
+                else:
+                    high = middle
+        if best:
+            cmds.filterCurve(curve, f="keyReducer", pm=1, pre=best)
+
 def lastKeyframeComparison(*keyframes):
 #GATHERS THE LAST KEYFRAME OF EVERY ORIGINAL CONTROL AND COMPARES TO SEE WHICH ONE WAS THE FURTHEST IN THE TIMELINE
-    lastKeyframe = max(*keyframes)
+    lastKeyframe = max(keyframes)
     return lastKeyframe
     
 def lastKeyframeCut(lastKeyframe, *controls):
@@ -51,9 +122,13 @@ def hideAttributes(type, *controls):
             
 def adjustControlSize(size, *controls):
 #ADJUSTS THE SCALE OF THE CONTROLS, WHICH IN TURN RESETS THE SLIDER TO THE ORIGINAL VALUE
-    for ctrl in controls:
-        for attr in ["Shape.localScaleX", "Shape.localScaleY", "Shape.localScaleZ"]:
-            cmds.setAttr(ctrl + attr, size)
+    for attr in controlSizeAttributes(*controls):
+        cmds.setAttr(attr, size)
+
+def controlSizeAttributes(*controls):
+#LISTS THE LOCAL SCALE ATTRIBUTES OF THE CONTROLS, FOR THE UI SLIDER TO CONNECT TO. THE SHAPES ARE LOOKED UP, SINCE MAYA MAY HAVE RENAMED THEM TO AVOID A CLASH
+    shapes = [cmds.listRelatives(ctrl, shapes=True, fullPath=True)[0] for ctrl in controls]
+    return [shape + attr for shape in shapes for attr in [".localScaleX", ".localScaleY", ".localScaleZ"]]
             
 
 def formLayout(name, topCoordinates, leftCoordinates):
@@ -65,6 +140,171 @@ def assistMessage(message, time):
 #POPS UP A MESSAGE ON THE USER'S SCREEN TO INFORM THEM OF SOMETHING
     cmds.inViewMessage(amg=message, pos='midCenter', fade=True, fst=time, ck=True)
     exit()
+
+tempNames = {}
+
+def tempName(node, suffix):
+#BUILDS A UNIQUE NAME FOR A TEMP NODE. THE DAG PATH AND NAMESPACE OF THE ORIGINAL GET FLATTENED, SO REFERENCED OR DUPLICATED RIGS NEVER CLASH,
+#AND THE LAST NUMBER HANDED OUT FOR EVERY NAME IS CACHED, SO USUALLY ONLY ONE NAME HAS TO BE CHECKED AGAINST THE SCENE
+    base = node.split("|")[-1].replace(":", "_") + suffix
+    index = tempNames.get(base, 0)
+    name = base + str(index) if index else base
+    while cmds.objExists(name):
+        index += 1
+        name = base + str(index)
+    tempNames[base] = index + 1
+    return name
+
+def createProxy(node, suffix, group):
+#CREATES AN EMPTY GROUP AS A PROXY FOR REFERENCING A CONTROL LATER ON. IT'S WIRED TO THE CONTROL THROUGH A MESSAGE CONNECTION,
+#WHICH ACTS AS A HANDLE THAT SURVIVES RENAMING, REPARENTING AND NAMESPACES, AND STAYS UNIQUE EVEN WHEN THE SAME RIG IS REFERENCED TWICE
+    proxy = cmds.group(n=tempName(node, suffix), em=True, p=group)
+    cmds.addAttr(proxy, ln="target", at="message")
+    cmds.connectAttr(node + ".message", proxy + ".target")
+    return proxy
+
+def proxyTarget(proxy):
+#FINDS THE CONTROL A PROXY STANDS FOR, AS A FULL DAG PATH. PROXIES FROM OLDER SETUPS HAVE NO CONNECTION, SO THEIR NAME IS USED INSTEAD
+    if cmds.attributeQuery("target", node=proxy, exists=True):
+        return cmds.ls(cmds.listConnections(proxy + ".target", s=True, d=False), long=True)[0]
+    return proxy.split("|")[-1][:-13]
+
+setupIndex = {}
+setupCallbacks = globals().get("setupCallbacks", [])  #A RELOAD RUNS IN THE SAME MODULE, SO THE LIST SURVIVES IT AND THE CALLBACKS OF THE PREVIOUS RUN CAN STILL BE REMOVED
+pendingSetups = []
+
+def registerSetup(group, kind, timelineStart, timelineEnd):
+#TAGS A NEW SETUP GROUP WITH ITS KIND AND BAKE RANGE, SO IT'S FOUND BY ITS ATTRIBUTES INSTEAD OF ITS NAME, AND ADDS IT TO THE INDEX
+    cmds.addAttr(group, ln="ikfkSetup", dt="string")
+    cmds.setAttr(group + ".ikfkSetup", kind, type="string")
+    cmds.addAttr(group, ln="bakeStart", at="double", dv=timelineStart)
+    cmds.addAttr(group, ln="bakeEnd", at="double", dv=timelineEnd)
+    cmds.addAttr(group, ln="networkNodes", at="message", m=True)  #THE MATRIX NETWORKS THE SETUP CREATES, SO THEY'RE DELETED WITH IT
+    setupIndex[cmds.ls(group, uuid=True)[0]] = kind
+
+def setupGroup(node):
+#WALKS UP FROM ANY NODE OF A SETUP TO ITS GROUP. OLDER SETUPS, MADE BEFORE THE GROUPS WERE TAGGED, ARE STILL RECOGNISED BY THEIR NAME
+    path = cmds.ls(node, long=True)
+    if not path:
+        return None
+    hierarchy = path[0].split("|")
+    for i in range(len(hierarchy), 1, -1):
+        if cmds.attributeQuery("ikfkSetup", node="|".join(hierarchy[:i]), exists=True):
+            return "|".join(hierarchy[:i])
+    if len(hierarchy) > 1 and ("temp_IK_Group" in hierarchy[1] or "temp_FK_Group" in hierarchy[1]):
+        return "|" + hierarchy[1]
+    return None
+
+def setupKind(group):
+#"IK" OR "FK", DEPENDING ON WHAT KIND OF TEMP SETUP THE GROUP HOLDS
+    if cmds.attributeQuery("ikfkSetup", node=group, exists=True):
+        return cmds.getAttr(group + ".ikfkSetup")
+    return "IK" if "temp_IK_Group" in group.split("|")[-1] else "FK"
+
+def setupProxies(group):
+#THE PROXIES OF A SETUP, IN THE ORDER THEY WERE CREATED
+    return [obj for obj in cmds.listRelatives(group, fullPath=True) or [] if cmds.attributeQuery("target", node=obj, exists=True) or obj.endswith("_temp_IK_Name") or obj.endswith("_temp_FK_Name")]
+
+def setupTemps(group):
+#THE PROXIES OF THE TEMP CONTROLS THAT LIVE INSIDE THE SETUP GROUP, AS OPPOSED TO THE ORIGINAL CONTROLS OF THE RIG
+    group = cmds.ls(group, long=True)[0]
+    return [proxy for proxy in setupProxies(group) if setupGroup(proxyTarget(proxy)) == group]
+
+def deleteSetupNodes(group):
+#DELETES A SETUP GROUP TOGETHER WITH THE NODES IT OWNS OUTSIDE OF ITS HIERARCHY, LIKE THE MATRIX NETWORKS AND THE CURVE SNAPSHOTS OF THE ORIGINAL CONTROLS
+    nodes = [group]
+    if cmds.attributeQuery("networkNodes", node=group, exists=True):
+        nodes += cmds.listConnections(group + ".networkNodes", s=True, d=False) or []
+    for proxy in setupProxies(group):
+        if cmds.attributeQuery("snapshotCurves", node=proxy, exists=True):
+            nodes += cmds.listConnections(proxy + ".snapshotCurves", s=True, d=False) or []
+    cmds.lockNode(group, l=False)
+    cmds.delete(nodes)
+
+def listSetups():
+#EVERY SETUP IN THE SCENE, STRAIGHT FROM THE INDEX
+    if not setupIndex:
+        return []
+    return sorted(set(cmds.ls(list(setupIndex), long=True)))
+
+def rebuildSetupIndex(*args):
+#SCANS THE SCENE FOR SETUP GROUPS. ONLY NEEDED WHEN A SCENE IS OPENED, THE CALLBACKS KEEP THE INDEX UP TO DATE FROM THEN ON
+    setupIndex.clear()
+    for group in cmds.ls("*.ikfkSetup", objectsOnly=True, long=True, recursive=True) or []:
+        setupIndex[cmds.ls(group, uuid=True)[0]] = cmds.getAttr(group + ".ikfkSetup")
+    refreshSetupList()
+
+def setupAdded(node, *args):
+#NODE ADDED CALLBACK. WHEN A NODE COMES BACK THROUGH AN UNDO, AN IMPORT OR A REFERENCE, ITS ATTRIBUTES AREN'T THERE YET, SO THE CHECK IS DEFERRED UNTIL MAYA IS IDLE
+    import maya.OpenMaya as om
+    if not pendingSetups:
+        cmds.evalDeferred(indexPendingSetups, lowestPriority=True)
+    pendingSetups.append(om.MObjectHandle(node))
+
+def indexPendingSetups():
+#ADDS THE NEW NODES THAT TURNED OUT TO BE SETUP GROUPS TO THE INDEX
+    import maya.OpenMaya as om
+    handles = pendingSetups[:]
+    del pendingSetups[:]
+    for handle in handles:
+        if handle.isValid():
+            node = om.MFnDependencyNode(handle.object())
+            if node.hasAttribute("ikfkSetup"):
+                setupIndex[node.uuid().asString()] = node.findPlug("ikfkSetup", False).asString()
+    refreshSetupList()
+
+def setupRemoved(node, *args):
+#NODE REMOVED CALLBACK, DROPS DELETED SETUPS FROM THE INDEX
+    import maya.OpenMaya as om
+    if setupIndex.pop(om.MFnDependencyNode(node).uuid().asString(), None) is not None:
+        cmds.evalDeferred(refreshSetupList, lowestPriority=True)
+
+def uninstallSetupCallbacks(*args):
+#UNHOOKS THE INDEX FROM MAYA. IT RUNS WHEN THE EXTRA OPTIONS CLOSE, AND BEFORE EVERY INSTALL, SO A RELOADED SCRIPT NEVER LEAVES THE OLD CALLBACKS BEHIND
+    if not setupCallbacks:
+        return
+    import maya.OpenMaya as om
+    for callback in setupCallbacks:
+        om.MMessage.removeCallback(callback)
+    del setupCallbacks[:]
+
+def installSetupCallbacks():
+#HOOKS THE INDEX UP TO MAYA, SO IT FOLLOWS SETUPS BEING CREATED AND DELETED WITHOUT RESCANNING THE SCENE. ONLY THE SETUP LIST IN THE EXTRA OPTIONS NEEDS IT,
+#SO IT'S DONE WHEN THAT OPENS, AND OpenMaya STAYS UNLOADED UNTIL THEN
+    uninstallSetupCallbacks()
+    import maya.OpenMaya as om
+    setupCallbacks.append(om.MDGMessage.addNodeAddedCallback(setupAdded, "transform"))
+    setupCallbacks.append(om.MDGMessage.addNodeRemovedCallback(setupRemoved, "transform"))
+    setupCallbacks.append(om.MSceneMessage.addCallback(om.MSceneMessage.kAfterOpen, rebuildSetupIndex))
+    setupCallbacks.append(om.MSceneMessage.addCallback(om.MSceneMessage.kAfterNew, rebuildSetupIndex))
+    rebuildSetupIndex()
+
+def setupSummary(group):
+#ONE LINE OF THE SETUP LIST: THE LIMB, ITS ORIGINAL CONTROLS, THE BAKE RANGE, THE KEYS ON THE TEMP CONTROLS AND ROUGHLY HOW MUCH MEMORY THE SETUP TAKES UP
+    proxies = setupProxies(group)
+    kind = setupKind(group)
+    tempProxies = setupTemps(group)
+    originals = [proxyTarget(proxy) for proxy in ([proxy for proxy in proxies if proxy not in tempProxies] if kind == "IK" else proxies[:2])]
+    temps = [proxyTarget(proxy) for proxy in tempProxies]
+    keyCount = sum(cmds.keyframe(temp, q=True, keyframeCount=True) or 0 for temp in temps if cmds.objExists(temp))
+    snapshotSize = sum(len(cmds.getAttr(proxy + ".snapshot") or "") for proxy in proxies if cmds.attributeQuery("snapshot", node=proxy, exists=True))
+    snapshotSize += 50 * sum(cmds.keyframe(copy, q=True, keyframeCount=True) or 0 for proxy in proxies if cmds.attributeQuery("snapshotCurves", node=proxy, exists=True) for copy in cmds.listConnections(proxy + ".snapshotCurves", s=True, d=False) or [])
+    frameRange = "%g-%g" % (cmds.getAttr(group + ".bakeStart"), cmds.getAttr(group + ".bakeEnd")) if cmds.attributeQuery("bakeStart", node=group, exists=True) else "-"
+    #A KEY TAKES UP ABOUT 50 BYTES: TIME, VALUE, TWO TANGENT ANGLES AND WEIGHTS, AND TWO TANGENT TYPES
+    return "%s   %s   %s   %d keys   %.1f KB" % (kind, ", ".join(original.split("|")[-1] for original in originals), frameRange, keyCount, (keyCount * 50 + snapshotSize) / 1024.0)
+
+def refreshSetupList():
+#FILLS THE SETUP LIST IN THE EXTRA OPTIONS FROM THE INDEX, IF THE WINDOW IS OPEN
+    if not cmds.textScrollList("Setups_ScrollList", ex=True):
+        return
+    cmds.textScrollList("Setups_ScrollList", e=True, removeAll=True)
+    for group in listSetups():
+        cmds.textScrollList("Setups_ScrollList", e=True, append=setupSummary(group), uniqueTag=group)
+
+def removeSelectedSetups(preserveAnimation):
+#TEARS DOWN EVERY SETUP PICKED IN THE LIST, BAKING ITS ANIMATION ACROSS OR DISCARDING IT. THEY GO THROUGH THE SWITCH QUEUE, SO BACKGROUND BAKES RUN ONE AFTER ANOTHER
+    for group in cmds.textScrollList("Setups_ScrollList", q=True, selectUniqueTagItem=True) or []:
+        queueSwitch(lambda group=group: deleteSetup(group, preserveAnimation))
     
 def locatorSize(control):
     if cmds.currentUnit(q=True) == "m":
@@ -83,6 +323,8 @@ def checkLocked(control):
 def constraint(parent, child, type, mo):
 #CONSTRAINT SYSTEM
     lockedAttributes = checkLocked(child)
+    if cmds.checkBoxGrp("MatrixConnections_CheckBox", q=True, v1=True) and matrixConstraint(parent, child, type, mo, lockedAttributes):
+        return
     if type == "parent":
         cmds.parentConstraint(parent, child, maintainOffset = mo, skipRotate = lockedAttributes)
     if type == "point":
@@ -90,6 +332,545 @@ def constraint(parent, child, type, mo):
     if type == "orient":
         cmds.orientConstraint(parent, child, maintainOffset = mo, skip = lockedAttributes)           
 
+def multiplyMatrices(a, b):
+#MULTIPLIES TWO 4X4 MATRICES GIVEN AS FLAT LISTS OF 16 VALUES, THE SAME WAY getAttr RETURNS THEM
+    return [sum(a[row * 4 + i] * b[i * 4 + column] for i in range(4)) for row in range(4) for column in range(4)]
+
+def matrixConstraint(parent, child, type, mo, lockedAttributes):
+#DRIVES THE CHILD WITH A multMatrix -> decomposeMatrix NETWORK INSTEAD OF A CONSTRAINT NODE. THE NETWORK EVALUATES IN PARALLEL AND IS CHEAPER PER FRAME.
+#RETURNS False WITHOUT CHANGING ANYTHING WHEN ONE OF THE CHANNELS IS ALREADY DRIVEN BY SOMETHING WE DON'T OWN, SO THE CALLER FALLS BACK TO A REGULAR CONSTRAINT.
+#THAT INCLUDES THE KEYED CHANNELS OF THE ORIGINAL CONTROLS, SO IN PRACTICE ONLY THE TEMP NODES AND THE UNKEYED ORIGINALS, LIKE THE JOINTS UNDER AN IK HANDLE, GET A NETWORK
+    channels = []
+    if type in ["parent", "point"]:
+        channels += [("outputTranslate" + axis, "translate" + axis) for axis in "XYZ" if type == "parent" or axis.lower() not in lockedAttributes]
+    if type in ["parent", "orient"]:
+        channels += [("outputRotate" + axis, "rotate" + axis) for axis in "XYZ" if axis.lower() not in lockedAttributes]
+    channels = [(output, attr) for output, attr in channels if not cmds.getAttr(child + "." + attr, lock=True)]
+    
+    temporary = setupGroup(child) is not None
+    for output, attr in channels:
+        sources = cmds.listConnections(child + "." + attr, s=True, d=False)
+        if sources and not (temporary and cmds.nodeType(sources[0]).startswith("animCurve")):
+            return False
+    for output, attr in channels:
+        if cmds.listConnections(child + "." + attr, s=True, d=False):
+            cmds.cutKey(child, at=attr, cl=True)  #THE KEYS ON OUR OWN TEMP NODES WOULD BE OVERRIDDEN ANYWAY, JUST LIKE UNDER A CONSTRAINT
+            
+    childWorld = cmds.getAttr(child + ".worldMatrix[0]")
+    parentWorld = cmds.getAttr(parent + ".worldMatrix[0]")
+    multMatrix = cmds.createNode("multMatrix", n=tempName(child, "_temp_multMatrix"))
+    if type == "point":
+        #ONLY THE POSITION GETS CARRIED OVER, SO THE OFFSET IS A WORLD SPACE TRANSLATION APPLIED AFTER THE PARENT'S MATRIX
+        offset = [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0] + ([childWorld[i] - parentWorld[i] for i in [12, 13, 14]] if mo else [0.0, 0.0, 0.0]) + [1.0]
+        cmds.connectAttr(parent + ".worldMatrix[0]", multMatrix + ".matrixIn[0]")
+        cmds.setAttr(multMatrix + ".matrixIn[1]", *offset, type="matrix")
+    else:
+        offset = multiplyMatrices(childWorld, cmds.getAttr(parent + ".worldInverseMatrix[0]")) if mo else [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+        cmds.setAttr(multMatrix + ".matrixIn[0]", *offset, type="matrix")
+        cmds.connectAttr(parent + ".worldMatrix[0]", multMatrix + ".matrixIn[1]")
+    cmds.connectAttr(child + ".parentInverseMatrix[0]", multMatrix + ".matrixIn[2]")
+    network = [multMatrix]
+    
+    decomposeMatrix = cmds.createNode("decomposeMatrix", n=tempName(child, "_temp_decomposeMatrix"))
+    cmds.connectAttr(multMatrix + ".matrixSum", decomposeMatrix + ".inputMatrix")
+    if cmds.attributeQuery("inputRotateOrder", node=decomposeMatrix, exists=True):
+        cmds.connectAttr(child + ".rotateOrder", decomposeMatrix + ".inputRotateOrder")
+    network.append(decomposeMatrix)
+    
+    rotationSource = decomposeMatrix
+    if cmds.nodeType(child) == "joint" and any(cmds.getAttr(child + ".jointOrient")[0]) and type != "point":
+        #A JOINT'S ROTATION SITS UNDER ITS JOINT ORIENT, SO THE ORIENT HAS TO BE TAKEN BACK OUT BEFORE THE ROTATION GETS DECOMPOSED
+        composeMatrix = cmds.createNode("composeMatrix", n=tempName(child, "_temp_composeMatrix"))
+        inverseMatrix = cmds.createNode("inverseMatrix", n=tempName(child, "_temp_inverseMatrix"))
+        orientMatrix = cmds.createNode("multMatrix", n=tempName(child, "_temp_orientMatrix"))
+        rotationSource = cmds.createNode("decomposeMatrix", n=tempName(child, "_temp_orientDecompose"))
+        cmds.connectAttr(child + ".jointOrient", composeMatrix + ".inputRotate")
+        cmds.connectAttr(composeMatrix + ".outputMatrix", inverseMatrix + ".inputMatrix")
+        cmds.connectAttr(multMatrix + ".matrixSum", orientMatrix + ".matrixIn[0]")
+        cmds.connectAttr(inverseMatrix + ".outputMatrix", orientMatrix + ".matrixIn[1]")
+        cmds.connectAttr(orientMatrix + ".matrixSum", rotationSource + ".inputMatrix")
+        if cmds.attributeQuery("inputRotateOrder", node=rotationSource, exists=True):
+            cmds.connectAttr(child + ".rotateOrder", rotationSource + ".inputRotateOrder")
+        network += [composeMatrix, inverseMatrix, orientMatrix, rotationSource]
+        
+    #LINKS THE NODES TO THE CONTROL THEY DRIVE AND TO THEIR SETUP, SO THEY'RE FOUND WITHOUT WALKING THE HISTORY AND removeConstraints NEVER TOUCHES THE RIG'S OWN MATRIX NODES
+    group = setupGroup(child) or setupGroup(parent)
+    for node in network:
+        cmds.addAttr(node, ln="tempConstraint", at="message")
+        cmds.connectAttr(child + ".message", node + ".tempConstraint")
+        if group and cmds.attributeQuery("networkNodes", node=group, exists=True):
+            cmds.connectAttr(node + ".message", group + ".networkNodes", na=True)
+    for output, attr in channels:
+        source = rotationSource if attr.startswith("rotate") else decomposeMatrix
+        cmds.connectAttr(source + "." + output, child + "." + attr, f=True)
+    return True
+
+def removeConstraints(*controls):
+#DELETES THE CONSTRAINTS DRIVING THE CONTROLS, AS WELL AS THE MATRIX NETWORKS THAT TAKE THEIR PLACE WHEN MATRIX CONNECTIONS ARE ON
+    for control in controls:
+        constraints = cmds.listRelatives(control, type="constraint")
+        if constraints:
+            cmds.delete(constraints)
+        matrixNodes = [plug.split(".")[0] for plug in cmds.listConnections(control + ".message", s=False, d=True, plugs=True) or [] if plug.endswith(".tempConstraint")]
+        if matrixNodes:
+            cmds.delete(matrixNodes)
+
+def drivenChannels(control, group):
+#THE CHANNELS OF A CONTROL THAT THE SETUP DRIVES, EITHER THROUGH ONE OF OUR MATRIX NETWORKS OR A CONSTRAINT TO A NODE OF THE SETUP, DIRECTLY OR THROUGH A PAIR BLEND.
+#EVERYTHING ELSE ON THE CONTROL IS LEFT AS THE ANIMATOR HAS IT
+    group = cmds.ls(group, long=True)[0]
+    channels = []
+    for attr in cmds.listAttr(control, keyable=True, unlocked=True, scalar=True) or []:
+        sources = cmds.listConnections(control + "." + attr, s=True, d=False, skipConversionNodes=True) or []
+        if sources and cmds.nodeType(sources[0]) == "pairBlend":
+            sources = cmds.listConnections(sources[0], s=True, d=False, type="constraint") or []
+        for source in sources:
+            if cmds.attributeQuery("tempConstraint", node=source, exists=True) or (cmds.objectType(source, isAType="constraint") and any(setupGroup(target) == group for target in set(cmds.listConnections(source + ".target", s=True, d=False) or []))):
+                channels.append(attr)
+                break
+    return channels
+
+def writeKeys(plug, times, values, layer=None):
+#KEYS A WHOLE RUN OF SAMPLES ON A PLUG IN A FEW COMMANDS INSTEAD OF ONE setKeyframe PER FRAME. THE SAMPLES GO INTO A FRESH CURVE THROUGH ITS ktv ARRAY IN ONE setAttr,
+#WHICH IS THEN PASTED OVER THE SAME RANGE OF THE PLUG, SO ANY KEYS OUTSIDE OF IT STAY. THE KEYS GET THE DEFAULT TANGENTS, JUST LIKE setKeyframe WOULD GIVE THEM
+    curveType = {"doubleLinear": "animCurveTL", "doubleAngle": "animCurveTA"}.get(cmds.getAttr(plug, type=True), "animCurveTU")
+    curve = cmds.createNode(curveType, n=tempName(plug.split("|")[-1].replace(".", "_"), "_temp_bake"))
+    keys = [key for time, value in zip(times, values) for key in (time, value)]
+    cmds.setAttr("%s.ktv[0:%d]" % (curve, len(times) - 1), *keys, size=len(times))
+    cmds.keyTangent(curve, e=True, itt=cmds.keyTangent(q=True, g=True, itt=True)[0], ott=cmds.keyTangent(q=True, g=True, ott=True)[0])
+    cmds.copyKey(curve)
+    if layer:
+        cmds.pasteKey(plug, option="replace", time=(times[0], times[0]), animLayer=layer)
+    else:
+        cmds.pasteKey(plug, option="replace", time=(times[0], times[0]))
+    cmds.delete(curve)
+
+def bakeControls(controls, timelineStart, timelineEnd, onFinish, onCancel=None, extraPlugs=()):
+#BAKES ALL THE CONTROLS IN A SINGLE PASS OVER THE TIMELINE, SO THE COST GROWS WITH THE CHAIN LENGTH INSTEAD OF RE-EVALUATING EVERY FRAME ONCE PER CONTROL.
+#IN THE BACKGROUND MODE THE BAKE IS SPLIT INTO SMALL WORK UNITS THAT RUN WHENEVER MAYA IS IDLE, AND THE REST OF THE SWITCH CARRIES ON FROM onFinish.
+#THE extraPlugs ARE SAMPLED IN THE SAME PASS WITHOUT BEING KEYED, AND onFinish GETS THEIR SAMPLES, OR None WHEN THE BAKE RAN IN THE FOREGROUND.
+#THAT WAY A SWITCH THAT NEEDS BOTH RUNS AS ONE JOB, AND A CANCEL NEVER LANDS BETWEEN TWO WRITE-BACKS
+    if not cmds.checkBoxGrp("RunInBackground_CheckBox", q=True, v1=True):
+        isolatedStates = isolateEvaluation(controls) if cmds.checkBoxGrp("IsolateEvaluation_CheckBox", q=True, v1=True) else []
+        try:
+            cmds.bakeResults(controls, t=(timelineStart, timelineEnd))
+        finally:
+            restoreEvaluation(isolatedStates)
+        if extraPlugs:
+            onFinish(None)
+        else:
+            onFinish()
+        return
+
+    #THE BACKGROUND SAMPLES WITH getAttr AT A GIVEN TIME, WHICH ONLY PULLS ON THE CONTROLS' UPSTREAM GRAPH, SO IT NEEDS NO ISOLATION
+    plugs = [control + "." + attr for control in controls for attr in cmds.listAttr(control, keyable=True, unlocked=True, scalar=True) or []]
+    frames = [timelineStart + i for i in range(int(timelineEnd - timelineStart) + 1)]
+
+    #ONCE EVERY FRAME IS SAMPLED, THE CONSTRAINTS CAN GO AND THE SAMPLES BECOME KEYS, ONE CURVE AT A TIME
+    def writeBack(samples):
+        removeConstraints(*controls)
+        for plug in plugs:
+            writeKeys(plug, frames, samples[plug])
+        if extraPlugs:
+            onFinish(samples)
+        else:
+            onFinish()
+
+    samplePlugs(plugs + [plug for plug in extraPlugs if plug not in plugs], frames, writeBack, onCancel)
+
+def samplePlugs(plugs, frames, onSampled, onCancel=None):
+#QUEUES A BACKGROUND JOB THAT SAMPLES THE PLUGS OVER THE FRAMES IN SMALL WORK UNITS, AND HANDS THE SAMPLES TO onSampled ONCE THEY'RE ALL IN
+    bakeJobs["active"] = {"plugs": plugs, "samples": dict((plug, []) for plug in plugs), "frames": frames, "index": 0,
+                          "onSampled": onSampled, "onCancel": onCancel, "started": perf_counter()}
+    updateProgress()
+    cmds.evalDeferred(bakeWorkUnit, lowestPriority=True)
+
+
+def isolateEvaluation(controls):
+#FINDS EVERYTHING THE CONTROLS DEPEND ON - THEIR HISTORY, THEIR PARENTS AND THE HISTORY OF THOSE - AND SWITCHES OFF THE HEAVY NODES OUTSIDE OF IT,
+#LIKE THE DEFORMERS, EXPRESSIONS AND SIMULATIONS OF OTHER CHARACTERS. RETURNS THE PLUGS IT SWITCHED OFF SO THEY CAN BE RESTORED AFTER THE BAKE,
+#EACH WITH A FLAG FOR WHETHER THE REFERENCE EDIT IT LEAVES BEHIND SHOULD BE REMOVED AGAIN. THAT'S ONLY THE CASE FOR REFERENCED NODES WITH NO nodeState EDIT OF THEIR OWN
+    upstream = set()
+    pending = cmds.ls(controls, long=True)
+    while pending:
+        history = cmds.ls(cmds.listHistory(pending) or [], long=True)
+        parents = ["|".join(node.split("|")[:i]) for node in history if node.startswith("|") for i in range(2, node.count("|") + 1)]
+        pending = [node for node in set(history + parents) if node not in upstream]
+        upstream.update(pending)
+
+    isolatedStates = []
+    cmds.undoInfo(openChunk=True)
+    try:
+        for node in cmds.ls(type=["geometryFilter", "expression", "nucleus", "nBase", "hairSystem", "particle"], long=True):
+            plug = node + ".nodeState"
+            if node in upstream or cmds.getAttr(plug, lock=True) or cmds.connectionInfo(plug, isDestination=True) or cmds.getAttr(plug) != 0:
+                continue
+            removeEdit = cmds.referenceQuery(node, isNodeReferenced=True) and not any(".nodeState" in edit for edit in cmds.referenceQuery(node, editStrings=True, editCommand="setAttr") or [])
+            cmds.setAttr(plug, 1)
+            isolatedStates.append((plug, removeEdit))
+    finally:
+        cmds.undoInfo(closeChunk=True)
+    return isolatedStates
+
+def restoreEvaluation(isolatedStates):
+#SWITCHES THE ISOLATED NODES BACK ON, AS ONE UNDO STEP, AND TAKES OUR nodeState EDITS BACK OUT OF THE REFERENCES. A MAYA VERSION THAT REFUSES TO REMOVE
+#EDITS FROM A LOADED REFERENCE KEEPS THEM, WHICH IS HARMLESS, SINCE THE VALUE THEY SET IS THE ONE THE FILE ALREADY HAS
+    cmds.undoInfo(openChunk=True)
+    try:
+        for plug, removeEdit in isolatedStates:
+            cmds.setAttr(plug, 0)
+            if removeEdit:
+                try:
+                    cmds.referenceEdit(plug, editCommand="setAttr", removeEdits=True, failedEdits=True, successfulEdits=True)
+                except RuntimeError:
+                    pass
+    finally:
+        cmds.undoInfo(closeChunk=True)
+
+
+bakeJobs = {"active": None, "queue": []}
+
+def bakeWorkUnit():
+#SAMPLES AS MANY FRAMES AS FIT IN A SHORT TIME SLICE, WITHOUT CHANGING THE CURRENT FRAME, THEN HANDS CONTROL BACK TO MAYA UNTIL IT'S IDLE AGAIN
+    job = bakeJobs["active"]
+    if job is None:
+        return
+    try:
+        sliceEnd = perf_counter() + 0.03
+        while job["index"] < len(job["frames"]) and perf_counter() < sliceEnd:
+            frame = job["frames"][job["index"]]
+            for plug in job["plugs"]:
+                job["samples"][plug].append(cmds.getAttr(plug, time=frame))
+            job["index"] += 1
+        updateProgress()
+        if job["index"] < len(job["frames"]):
+            cmds.evalDeferred(bakeWorkUnit, lowestPriority=True)
+            return
+
+        #ALL FRAMES ARE SAMPLED, SO THE SAMPLES ARE HANDED OVER. WHATEVER IS DONE WITH THEM GOES IN ONE UNDO CHUNK WITH THE REST OF THE SWITCH
+        bakeJobs["active"] = None
+        cmds.undoInfo(openChunk=True)
+        try:
+            job["onSampled"](job["samples"])
+        finally:
+            cmds.undoInfo(closeChunk=True)
+    except Exception:
+        cancelSwitch()
+        raise
+    except SystemExit:
+        pass
+    updateProgress()
+    runNextSwitch()
+
+def updateProgress():
+#SHOWS HOW FAR THE BACKGROUND BAKE IS, AT WHAT SPEED, AND HOW MANY SWITCHES ARE WAITING BEHIND IT
+    if not cmds.progressBar("Bake_ProgressBar", ex=True):
+        return
+    job = bakeJobs["active"]
+    if job is None:
+        cmds.progressBar("Bake_ProgressBar", e=True, pr=0)
+        cmds.text("BakeProgress_Text", e=True, l="")
+        cmds.button("CancelSwitch_Button", e=True, en=False)
+        return
+    framesDone = job["index"]
+    framesPerSecond = framesDone / max(perf_counter() - job["started"], 0.001)
+    eta = (len(job["frames"]) - framesDone) / framesPerSecond if framesDone else 0.0
+    cmds.progressBar("Bake_ProgressBar", e=True, max=len(job["frames"]), pr=framesDone)
+    cmds.text("BakeProgress_Text", e=True, l="Frame %d/%d   %.1f fps   ETA %.1fs   %d queued" % (framesDone, len(job["frames"]), framesPerSecond, eta, len(bakeJobs["queue"])))
+    cmds.button("CancelSwitch_Button", e=True, en=True)
+
+def cancelSwitch():
+#STOPS THE BACKGROUND BAKE, ROLLS BACK THE SWITCH THAT STARTED IT AND CLEARS THE QUEUE. NOTHING IS KEYED UNTIL THE LAST FRAME IS SAMPLED, SO THERE'S NO ANIMATION TO UNDO
+    job = bakeJobs["active"]
+    bakeJobs["active"] = None
+    bakeJobs["queue"] = []
+    if job is not None and job["onCancel"] is not None:
+        job["onCancel"]()
+    updateProgress()
+
+def queueSwitch(switch):
+#RUNS A SWITCH RIGHT AWAY, OR QUEUES IT BEHIND THE ONE THAT'S STILL BAKING. THE SELECTION IS STORED, SO THE QUEUED SWITCH STILL KNOWS WHICH CONTROLS IT'S FOR
+    bakeJobs["queue"].append((switch, cmds.ls(sl=True)))
+    if bakeJobs["active"] is None:
+        runNextSwitch()
+    else:
+        updateProgress()
+
+def runNextSwitch():
+#STARTS THE QUEUED SWITCHES ONE AFTER ANOTHER, WAITING WHENEVER ONE OF THEM IS BAKING IN THE BACKGROUND
+    while bakeJobs["queue"] and bakeJobs["active"] is None:
+        switch, selection = bakeJobs["queue"].pop(0)
+        selection = [obj for obj in selection if cmds.objExists(obj)]
+        if selection:
+            cmds.select(selection)
+        else:
+            cmds.select(cl=True)
+        try:
+            switch()
+        except SystemExit:
+            pass
+
+
+tangentTypes = ["auto", "clamped", "fast", "fixed", "flat", "linear", "plateau", "slow", "spline", "step", "stepnext"]
+infinityTypes = ["constant", "linear", "cycle", "cycleRelative", "oscillate"]
+channelHeader = struct.Struct("<HIBBB")
+
+def baseInput(plug):
+#THE PLUG THAT HOLDS THE BASE ANIMATION OF A CHANNEL. IT LOOKS THROUGH ANIMATION LAYER BLENDS AND CONSTRAINT PAIR BLENDS, SO IT NEVER PICKS UP WHATEVER LAYER HAPPENS TO BE ACTIVE
+    while True:
+        incoming = cmds.listConnections(plug, s=True, d=False, plugs=True, skipConversionNodes=True)
+        if not incoming:
+            return plug
+        node, attr = incoming[0].split(".", 1)
+        nodeType = cmds.nodeType(node)
+        if nodeType.startswith("animBlendNode"):
+            plug = node + "." + attr.replace("output", "inputA")
+        elif nodeType == "pairBlend":
+            plug = node + "." + attr.replace("out", "in") + "1"
+        else:
+            return plug
+
+def keyedCurve(plug):
+#THE ANIM CURVE BEHIND A PLUG ON THE BASE ANIMATION, OR None WHEN THE BASE VALUE ISN'T KEYED
+    incoming = cmds.listConnections(baseInput(plug), s=True, d=False, skipConversionNodes=True)
+    return incoming[0] if incoming and cmds.nodeType(incoming[0]).startswith("animCurve") else None
+
+def snapshotCurves(control):
+#PACKS EVERY KEYABLE CHANNEL OF THE CONTROL INTO A COMPACT BINARY SNAPSHOT. KEY TIMES, VALUES AND TANGENTS ARE STORED AS FLAT ARRAYS, STATIC CHANNELS ONLY STORE THEIR VALUE.
+#IT'S THE FINGERPRINT THAT TELLS IF A CONTROL HAS BEEN EDITED, SO TANGENT LOCKS, WEIGHT LOCKS AND BREAKDOWNS ARE IN IT AS WELL.
+#UNKEYED CHANNELS THAT ARE DRIVEN BY A CONNECTION ARE LEFT OUT, SINCE THEIR VALUE DEPENDS ON THE CURRENT FRAME AND NOT ON ANY EDIT
+    blob = bytearray()
+    for attr in cmds.listAttr(control, keyable=True, unlocked=True, scalar=True) or []:
+        plug = control + "." + attr
+        name = attr.encode("utf-8")
+        keyCount = cmds.keyframe(plug, q=True, kc=True)
+        if keyCount == 0 and cmds.connectionInfo(plug, isDestination=True):
+            continue
+        if keyCount == 0:
+            blob += channelHeader.pack(len(name), 0, 0, 0, 0) + name
+            blob += array.array("d", [cmds.getAttr(plug)]).tobytes()
+            continue
+        weighted = cmds.keyTangent(plug, q=True, weightedTangents=True)[0]
+        preInfinity = cmds.setInfinity(plug, q=True, pri=True)[0]
+        postInfinity = cmds.setInfinity(plug, q=True, poi=True)[0]
+        blob += channelHeader.pack(len(name), keyCount, weighted, infinityTypes.index(preInfinity), infinityTypes.index(postInfinity)) + name
+        keys = array.array("d", cmds.keyframe(plug, q=True, tc=True))
+        keys.extend(cmds.keyframe(plug, q=True, vc=True))
+        for flag in ["ia", "oa", "iw", "ow"]:
+            keys.extend(cmds.keyTangent(plug, q=True, **{flag: True}))
+        tangents = array.array("B", [tangentTypes.index(t) if t in tangentTypes else 0 for t in cmds.keyTangent(plug, q=True, itt=True) + cmds.keyTangent(plug, q=True, ott=True)])
+        breakdowns = set(cmds.keyframe(plug, q=True, breakdown=True) or [])
+        flags = array.array("B", [lock | weightLock << 1 | (time in breakdowns) << 2 for lock, weightLock, time in zip(cmds.keyTangent(plug, q=True, lock=True), cmds.keyTangent(plug, q=True, weightLock=True), keys)])
+        blob += keys.tobytes() + tangents.tobytes() + flags.tobytes()
+    return base64.b64encode(zlib.compress(bytes(blob))).decode("ascii")
+
+def snapshotChannels(snapshot):
+#UNPACKS A SNAPSHOT INTO ITS CHANNELS, WITH THE VALUE OF THE STATIC ONES AND None FOR THE KEYED ONES
+    blob = zlib.decompress(base64.b64decode(snapshot))
+    channels = []
+    offset = 0
+    while offset < len(blob):
+        nameLength, keyCount, weighted, preInfinity, postInfinity = channelHeader.unpack_from(blob, offset)
+        offset += channelHeader.size
+        attr = blob[offset:offset + nameLength].decode("utf-8")
+        offset += nameLength
+        if keyCount == 0:
+            channels.append((attr, array.array("d", blob[offset:offset + 8])[0]))
+            offset += 8
+        else:
+            channels.append((attr, None))
+            offset += 51 * keyCount  #6 DOUBLES, 2 TANGENT TYPES AND THE FLAGS OF EVERY KEY
+    return channels
+
+def restoreCurves(proxy, channels=None):
+#PUTS THE SNAPSHOT BACK ON THE ORIGINAL CONTROL. A KEYED CHANNEL GETS ITS DUPLICATED CURVE CONNECTED IN PLACE OF THE CURRENT ONE, SO EVERY KEY, TANGENT, LOCK, BREAKDOWN AND INFINITY
+#COMES BACK EXACTLY, IN ONE STEP PER CHANNEL. A STATIC CHANNEL GETS ITS VALUE BACK. IT WORKS ON THE BASE ANIMATION, EVEN WHEN THE CONTROL IS IN OTHER ANIMATION LAYERS
+    control = proxyTarget(proxy)
+    copies = {cmds.getAttr(copy + ".snapshotChannel"): copy for copy in cmds.listConnections(proxy + ".snapshotCurves", s=True, d=False) or []}
+    for attr, value in snapshotChannels(cmds.getAttr(proxy + ".snapshot")):
+        if channels is not None and attr not in channels:
+            continue
+        plug = control + "." + attr
+        current = keyedCurve(plug)
+        destinations = cmds.listConnections(current + ".output", s=False, d=True, plugs=True) if current else [baseInput(plug)]
+        if current:
+            cmds.delete(current)
+        if attr in copies:
+            copy = copies[attr]
+            cmds.disconnectAttr(copy + ".message", cmds.listConnections(copy + ".message", s=False, d=True, plugs=True)[0])
+            cmds.deleteAttr(copy, at="snapshotChannel")
+            for destination in destinations:
+                cmds.connectAttr(copy + ".output", destination, f=True)
+            if current:
+                cmds.rename(copy, current)
+        else:
+            for destination in destinations:
+                if not cmds.listConnections(destination, s=True, d=False):
+                    cmds.setAttr(destination, value)
+
+def storeSnapshot(proxy, control, *drivers):
+#SAVES THE SNAPSHOT OF A CONTROL ON ITS PROXY GROUP, ALONG WITH THE TEMP CONTROLS THAT DRIVE IT.
+#FOR AN ORIGINAL CONTROL, THE ONE WITH DRIVERS, EVERY CURVE IS ALSO DUPLICATED AND LINKED TO THE PROXY, SO IT CAN BE PUT BACK AS IT IS
+    cmds.addAttr(proxy, ln="snapshot", dt="string")
+    cmds.setAttr(proxy + ".snapshot", snapshotCurves(control), type="string")
+    if drivers:
+        cmds.addAttr(proxy, ln="drivers", at="message", m=True)
+        for index, driver in enumerate(drivers):
+            cmds.connectAttr(driver + ".message", "%s.drivers[%d]" % (proxy, index))
+        cmds.addAttr(proxy, ln="snapshotCurves", at="message", m=True)
+        for attr in cmds.listAttr(control, keyable=True, unlocked=True, scalar=True) or []:
+            curve = keyedCurve(control + "." + attr)
+            if curve:
+                copy = cmds.duplicate(curve, n=tempName(curve, "_snapshot"))[0]
+                cmds.addAttr(copy, ln="snapshotChannel", dt="string")
+                cmds.setAttr(copy + ".snapshotChannel", attr, type="string")
+                cmds.connectAttr(copy + ".message", proxy + ".snapshotCurves", na=True)
+
+def isUntouched(proxy):
+#COMPARES THE CURRENT CURVES OF A TEMP CONTROL TO ITS SNAPSHOT, TO KNOW IF THE ANIMATOR HAS EDITED IT SINCE THE SETUP WAS APPLIED
+    if not cmds.attributeQuery("snapshot", node=proxy, exists=True):
+        return False
+    return snapshotCurves(proxyTarget(proxy)) == cmds.getAttr(proxy + ".snapshot")
+
+def sampleWorldMatrices(nodes, timelineStart, timelineEnd):
+#SAMPLES THE WORLD MATRIX OF EVERY NODE IN ONE PASS OVER THE TIMELINE. EACH NODE GETS ONE FLAT array, WITH 16 VALUES PER FRAME
+    nodes = cmds.ls(nodes, long=True)
+    samples = {node: array.array("d") for node in nodes}
+    for i in range(int(timelineEnd - timelineStart) + 1):
+        for node in nodes:
+            samples[node].extend(cmds.getAttr(node + ".worldMatrix[0]", time=timelineStart + i))
+    return samples
+
+def verificationSamples(nodes, timelineStart, timelineEnd):
+#TAKES THE REFERENCE SAMPLES BEFORE A SWITCH, BUT ONLY WHEN THE USER ASKED FOR THE ACCURACY TO BE VERIFIED
+    if not cmds.checkBoxGrp("VerifyAccuracy_CheckBox", q=True, v1=True):
+        return None
+    return sampleWorldMatrices(nodes, timelineStart, timelineEnd)
+
+def poseErrors(before, after, frameCount):
+#RETURNS THE MAX AND RMS OF THE POSITION DISTANCE AND THE ROTATION ANGLE (IN DEGREES) BETWEEN THE TWO SETS OF SAMPLES, AS ONE array PER MEASURE WITH ONE VALUE PER FRAME.
+#SCALE IS TAKEN OUT OF THE ROTATION ROWS, SO A SCALED RIG DOESN'T SHOW UP AS A ROTATION ERROR
+    maxPosition, rmsPosition, maxRotation, rmsRotation = [array.array("d", [0.0]) * frameCount for i in range(4)]
+    for node in before:
+        a, b = before[node], after[node]
+        for frame in range(frameCount):
+            i = frame * 16
+            position = math.sqrt((b[i + 12] - a[i + 12]) ** 2 + (b[i + 13] - a[i + 13]) ** 2 + (b[i + 14] - a[i + 14]) ** 2)
+            trace = 0.0
+            for row in (i, i + 4, i + 8):
+                rowA, rowB = a[row:row + 3], b[row:row + 3]
+                lengths = math.sqrt(sum(value * value for value in rowA) * sum(value * value for value in rowB)) or 1.0
+                trace += sum(valueA * valueB for valueA, valueB in zip(rowA, rowB)) / lengths
+            rotation = math.degrees(math.acos(max(-1.0, min(1.0, (trace - 1.0) / 2.0))))
+            maxPosition[frame] = max(maxPosition[frame], position)
+            maxRotation[frame] = max(maxRotation[frame], rotation)
+            rmsPosition[frame] += position * position
+            rmsRotation[frame] += rotation * rotation
+    for frame in range(frameCount):
+        rmsPosition[frame] = math.sqrt(rmsPosition[frame] / len(before))
+        rmsRotation[frame] = math.sqrt(rmsRotation[frame] / len(before))
+    return maxPosition, rmsPosition, maxRotation, rmsRotation
+
+def verifyAccuracy(before, timelineStart, timelineEnd):
+#SAMPLES THE SAME NODES AGAIN ONCE THE SWITCH IS DONE, AND REPORTS EVERY FRAME WHERE THE POSE MOVED FURTHER THAN THE TOLERANCE
+    if not before:
+        return None
+    frames = [timelineStart + i for i in range(int(timelineEnd - timelineStart) + 1)]
+    after = sampleWorldMatrices(list(before), timelineStart, timelineEnd)
+    maxPosition, rmsPosition, maxRotation, rmsRotation = poseErrors(before, after, len(frames))
+    tolerance = cmds.floatFieldGrp("Tolerance_FloatField", q=True, v1=True)
+    failedFrames = [index for index in range(len(frames)) if maxPosition[index] > tolerance or maxRotation[index] > tolerance]
+    
+    for index in failedFrames:
+        print("IK/FK Switcher - frame %g:   position max %.5f rms %.5f   rotation max %.5f rms %.5f" % (frames[index], maxPosition[index], rmsPosition[index], maxRotation[index], rmsRotation[index]))
+    if failedFrames:
+        message = "<hl>%d of %d frames are off by more than %g. Worst position error %.4f, worst rotation error %.3f degrees. See the Script Editor for the frames.<hl>" % (len(failedFrames), len(frames), tolerance, max(maxPosition), max(maxRotation))
+    else:
+        message = "Verified %d frames, all within a tolerance of %g." % (len(frames), tolerance)
+    cmds.inViewMessage(amg=message, pos='midCenter', fade=True, fst=3000 if failedFrames else 1500, ck=True)
+    return maxPosition, rmsPosition, maxRotation, rmsRotation
+
+def layerPlugs(proxies):
+#THE PLUGS OF THE ORIGINAL CONTROLS THAT THE LAYER OUTPUT SAMPLES: THE CHANNELS THE SETUP DRIVES
+    return [proxyTarget(proxy) + "." + attr for proxy in proxies for attr in drivenChannels(proxyTarget(proxy), setupGroup(proxy))]
+
+def outputToLayer(proxies, timelineStart, timelineEnd, onFinish, samples=None):
+#WRITES WHAT THE TEMP SETUP DOES TO THE ORIGINAL CONTROLS INTO AN OVERRIDE ANIMATION LAYER, INSTEAD OF BAKING OVER THEIR CURVES.
+#THE DRIVEN CHANNELS ARE SAMPLED IN ONE PASS, IN THE BACKGROUND WORK UNITS WHEN THAT'S ON, UNLESS THE SAMPLES COME FROM A BAKE THAT ALREADY TOOK THEM.
+#THE ORIGINAL CURVES COME BACK FROM THE SNAPSHOT, AND ONLY THE CHANNELS THAT DIFFER FROM THEM GET KEYED INTO THE LAYER. THE REST OF THE SWITCH CARRIES ON FROM onFinish
+    controls = [proxyTarget(proxy) for proxy in proxies]
+    channels = [drivenChannels(control, setupGroup(proxy)) for proxy, control in zip(proxies, controls)]
+    frames = [timelineStart + i for i in range(int(timelineEnd - timelineStart) + 1)]
+    plugs = [control + "." + attr for control, attrs in zip(controls, channels) for attr in attrs]
+
+    #THE RESTORED CURVES ARE EVALUATED WITH ONE keyframe CALL PER PLUG, SO THE COMPARISON DOESN'T WALK THE TIMELINE AGAIN IN THE FOREGROUND
+    def writeLayer(driven):
+        for proxy, control, attrs in zip(proxies, controls, channels):
+            removeConstraints(control)
+            restoreCurves(proxy, attrs)
+        times = [(frame, frame) for frame in frames]
+        changedPlugs = []
+        for plug in plugs:
+            curve = keyedCurve(plug)
+            original = cmds.keyframe(curve, q=True, eval=True, t=times) if curve else [cmds.getAttr(baseInput(plug))] * len(frames)
+            if any(abs(before - after) > 0.00001 for before, after in zip(original, driven[plug])):
+                changedPlugs.append(plug)
+        if changedPlugs:
+            layer = cmds.animLayer(tempName(controls[0], "_ikfkLayer"), override=True)
+            cmds.addAttr(layer, ln="ikfkLayer", dt="string")  #TAGS THE LAYER AS OURS AND REMEMBERS WHICH CONTROLS IT'S FOR
+            cmds.setAttr(layer + ".ikfkLayer", " ".join(control.split("|")[-1] for control in controls), type="string")
+            cmds.animLayer(layer, e=True, attribute=changedPlugs)
+            for plug in changedPlugs:
+                writeKeys(plug, frames, driven[plug], layer)
+            cmds.filterCurve(cmds.animLayer(layer, q=True, animCurves=True))
+            refreshLayerList()
+        onFinish()
+
+    if samples is not None or not plugs:
+        writeLayer(samples or {})
+        return
+    if cmds.checkBoxGrp("RunInBackground_CheckBox", q=True, v1=True):
+        samplePlugs(plugs, frames, writeLayer)
+        return
+    driven = {plug: array.array("d") for plug in plugs}
+    for frame in frames:
+        for plug in plugs:
+            driven[plug].append(cmds.getAttr(plug, time=frame))
+    writeLayer(driven)
+
+def switchLayers():
+#THE ANIMATION LAYERS THE TOOL HAS WRITTEN SWITCHES INTO
+    return [layer for layer in cmds.ls(type="animLayer") or [] if cmds.attributeQuery("ikfkLayer", node=layer, exists=True)]
+
+def commitLayer(layer):
+#MERGES THE LAYER DOWN INTO THE BASE ANIMATION, WHICH MAKES THE SWITCH PERMANENT
+    import maya.mel as mel
+    mel.eval('animLayerMerge {"%s", "%s"}' % (layer, cmds.animLayer(q=True, root=True)))
+
+def revertLayer(layer):
+#DELETING THE LAYER BRINGS BACK THE ANIMATION FROM BEFORE THE SWITCH, WITHOUT ANOTHER BAKE
+    cmds.delete(layer)
+
+def toggleLayer(layer):
+#MUTES OR UNMUTES THE LAYER, TO FLIP BETWEEN THE ORIGINAL AND THE SWITCHED MOTION
+    cmds.animLayer(layer, e=True, mute=not cmds.animLayer(layer, q=True, mute=True))
+
+def refreshLayerList():
+#FILLS THE LAYER LIST IN THE EXTRA OPTIONS, IF THE WINDOW IS OPEN
+    if not cmds.textScrollList("Layers_ScrollList", ex=True):
+        return
+    cmds.textScrollList("Layers_ScrollList", e=True, removeAll=True)
+    for layer in switchLayers():
+        state = "   (muted)" if cmds.animLayer(layer, q=True, mute=True) else ""
+        cmds.textScrollList("Layers_ScrollList", e=True, append=layer + "   " + cmds.getAttr(layer + ".ikfkLayer") + state, uniqueTag=layer)
+
+def editSelectedLayers(action):
+#RUNS commitLayer, revertLayer OR toggleLayer ON EVERY LAYER PICKED IN THE LIST
+    for layer in cmds.textScrollList("Layers_ScrollList", q=True, selectUniqueTagItem=True) or []:
+        if cmds.objExists(layer):
+            action(layer)
+    refreshLayerList()
+
 ##################################################################################################################################################################################################################
         
         
@@ -99,43 +880,56 @@ def fk_To_IK():
     refPreserveAnimation = cmds.checkBoxGrp("PreserveAnimation_CheckBox", q=True, v1=True)
     refHideOriginalControls = cmds.checkBoxGrp("HideOriginalControls_CheckBox", q=True, v1=True)
 
-    #SEPARATES THE SELECTED CONTROLS INTO THEIR OWN VARIABLES
+    #SEPARATES THE SELECTED CONTROLS INTO THEIR OWN VARIABLES. ANY CHAIN OF 3 OR MORE CONTROLS WORKS
     fk_CTRLS = cmds.ls(sl=True)
-    if len(fk_CTRLS) != 3:
-        assistMessage("<hl>Incorrect number of controls selected. To apply an IK setup, you need to select 3 FK controls, in order of parent to child.<hl>", 4000)
+    if len(fk_CTRLS) < 3:
+        assistMessage("<hl>Incorrect number of controls selected. To apply an IK setup, you need to select 3 or more FK controls, in order of parent to child.<hl>", 4000)
     parent_CTRL = fk_CTRLS[0]
-    middle_CTRL = fk_CTRLS[1]
-    child_CTRL = fk_CTRLS[2]
+    child_CTRL = fk_CTRLS[-1]
     cmds.select(cl=True)
     
     #QUERIES THE START AND END FRAME OF THE CURRENT TIMELINE
     timelineStart = cmds.playbackOptions(min=True, q=True)
     timelineEnd = cmds.playbackOptions(max=True, q=True)
-
-    #CREATES TEMPORARY CONTROLS
-    parent_temp_JNT = cmds.joint(n=parent_CTRL + "_temp_JNT")
-    middle_temp_JNT = cmds.joint(n=middle_CTRL + "_temp_JNT")
-    child_temp_JNT = cmds.joint(n=child_CTRL + "_temp_JNT")
-
-    temp_IK_CTRL = cmds.spaceLocator(n=child_CTRL + "_temp_IK_CTRL")[0]
-    locatorSize(temp_IK_CTRL)
-    temp_PV = cmds.spaceLocator(n=middle_CTRL + "_temp_PV")[0]
-    locatorSize(temp_PV)
-    hideAttributes("rotate", temp_PV)
-    hideAttributes("scale", temp_IK_CTRL, temp_PV)
+    verificationReference = verificationSamples(fk_CTRLS, timelineStart, timelineEnd)
+
+    #CREATES TEMPORARY CONTROLS, ONE JOINT FOR EVERY FK CONTROL
+    temp_JNTS = [cmds.joint(n=tempName(ctrl, "_temp_JNT")) for ctrl in fk_CTRLS]
+    parent_temp_JNT = temp_JNTS[0]
+    child_temp_JNT = temp_JNTS[-1]
+
+    #THE CHAIN IS SOLVED IN SEGMENTS OF THREE JOINTS THAT SHARE THEIR END JOINTS, EACH WITH ITS OWN ROTATE PLANE HANDLE, END CONTROL AND POLE VECTOR, SO EVERY JOINT KEEPS ITS POSE.
+    #WITH AN EVEN NUMBER OF JOINTS THE FIRST BONE IS LEFT OVER, SO IT GETS A BASE CONTROL THAT ROTATES IT
+    firstSegment = (len(fk_CTRLS) + 1) % 2
+    segments = [(i, i + 1, i + 2) for i in range(firstSegment, len(fk_CTRLS) - 2, 2)]
+    temp_Base_CTRLS = [cmds.spaceLocator(n=tempName(parent_CTRL, "_temp_IK_Base"))[0]] if firstSegment else []
+    temp_End_CTRLS = [cmds.spaceLocator(n=tempName(fk_CTRLS[end], "_temp_IK_CTRL"))[0] for start, middle, end in segments]
+    temp_PVS = [cmds.spaceLocator(n=tempName(fk_CTRLS[middle], "_temp_PV"))[0] for start, middle, end in segments]
+    temp_IK_CTRL = temp_End_CTRLS[-1]
+    temp_CTRLS = temp_Base_CTRLS + [ctrl for pair in zip(temp_End_CTRLS, temp_PVS) for ctrl in pair]
+    for ctrl in temp_CTRLS:
+        locatorSize(ctrl)
+    hideAttributes("translate", *temp_Base_CTRLS)
+    hideAttributes("rotate", *temp_PVS + temp_End_CTRLS[:-1])
+    hideAttributes("scale", *temp_CTRLS)
     
     original_RO = cmds.getAttr(child_CTRL + ".rotateOrder")  #STORES THE ROTATION ORDER OF THE CURRENT CONTROL, TO BE ASSIGNED TO THE TEMP CONTROLS
 
-    temp_IK_Contents = [parent_CTRL, middle_CTRL, child_CTRL, temp_IK_CTRL, temp_PV]
-    temp_IK_Group = cmds.group(parent_temp_JNT, temp_IK_CTRL, temp_PV, n=parent_CTRL + "_temp_IK_Group")
+    temp_IK_Contents = fk_CTRLS + temp_CTRLS
+    temp_IK_Group = cmds.group(parent_temp_JNT, *temp_CTRLS, n=tempName(parent_CTRL, "_temp_IK_Group"))
+    registerSetup(temp_IK_Group, "IK", timelineStart, timelineEnd)
     
     
-    #CREATES EMPTY GROUPS AS PROXIES FOR REFERENCING THE ACTUAL CONTROLS LATER ON
+    #CREATES EMPTY GROUPS AS PROXIES FOR REFERENCING THE ACTUAL CONTROLS LATER ON, AND SNAPSHOTS THE ORIGINAL CURVES ON THEM
+    temp_IK_Proxies = []
     for obj in temp_IK_Contents:
-        cmds.group(n=obj + "_temp_IK_Name", em=True, p=temp_IK_Group)
+        temp_IK_Proxies.append(createProxy(obj, "_temp_IK_Name", temp_IK_Group))
+    for proxy, obj in zip(temp_IK_Proxies[:len(fk_CTRLS)], fk_CTRLS):
+        storeSnapshot(proxy, obj, *temp_CTRLS)
 
 
     def get_PoleVectorPosition(pos_Parent, pos_Middle, pos_Child):
+        import maya.OpenMaya as om  #ONLY NEEDED FOR THE POLE VECTOR, SO IT'S IMPORTED THE FIRST TIME ONE IS SOLVED
         vector_parentJoint = om.MVector(pos_Parent[0], pos_Parent[1], pos_Parent[2])
         vector_middleJoint = om.MVector(pos_Middle[0], pos_Middle[1], pos_Middle[2])
         vector_childJoint = om.MVector(pos_Child[0], pos_Child[1], pos_Child[2])
@@ -154,71 +948,103 @@ def fk_To_IK():
         
         return position_poleVector
 
-    #SNAPS THE TEMP CONTROLS TO THE POSITION OF THE ORIGINAL CONTROLS, BAKES THE ANIMATION DATA, THEN DELETES CONSTRAINTS
-    def positionalSetup(parent, child):
+    #SNAPS THE TEMP CONTROLS TO THE POSITION OF THE ORIGINAL CONTROLS AND CONSTRAINS THEM, SO THEY CAN ALL BE BAKED TOGETHER AFTERWARDS
+    #A POLE VECTOR IS PLACED FROM THE THREE JOINTS OF ITS SEGMENT
+    def positionalSetup(parent, child, segment=None):
         cmds.setAttr(child + ".rotateOrder", original_RO)
         cmds.matchTransform(child, parent, position=True, rotation=True)
-        if "temp_PV" in child:
-            position_parentJoint = cmds.xform(parent_temp_JNT, q=True, ws=True, t=True)
-            position_middleJoint = cmds.xform(middle_temp_JNT, q=True, ws=True, t=True)
-            position_childJoint = cmds.xform(child_temp_JNT, q=True, ws=True, t=True)
-            position = get_PoleVectorPosition(position_parentJoint, position_middleJoint, position_childJoint)
+        if segment:
+            position = get_PoleVectorPosition(*[cmds.xform(temp_JNTS[i], q=True, ws=True, t=True) for i in segment])
             cmds.move(position.x, position.y, position.z, child)
-        if "JNT" in child:
+        if child in temp_JNTS:
             cmds.makeIdentity(child, apply=True, t=True, r=True, s=True)
         lastKeyframe = cmds.findKeyframe(parent, which="last")
         constraint(parent, child, "parent", True)
-        cmds.select(child)
-        if refPreserveAnimation:
-            cmds.bakeResults(t=(timelineStart, timelineEnd))                
-        cmds.delete(cmds.listRelatives(type="constraint"))
         return lastKeyframe
 
-    parentLastKeyframe = positionalSetup(parent_CTRL, parent_temp_JNT)
-    middleLastKeyframe = positionalSetup(middle_CTRL, middle_temp_JNT)
-    childLastKeyframe = positionalSetup(child_CTRL, child_temp_JNT)
-    positionalSetup(child_temp_JNT, temp_IK_CTRL)
-    positionalSetup(middle_temp_JNT, temp_PV)
-    
-    #CUTS THE TIMELINE UP TO WHERE THE LAST KEYFRAME WAS, FROM THE PREVIOUS CONTROLS
-    lastKeyframe = lastKeyframeComparison(parentLastKeyframe, middleLastKeyframe, childLastKeyframe)
-    lastKeyframeCut(lastKeyframe, temp_IK_CTRL, temp_PV)
+    originalLastKeyframes = [positionalSetup(ctrl, temp_JNT) for ctrl, temp_JNT in zip(fk_CTRLS, temp_JNTS)]
+    for temp_Base_CTRL in temp_Base_CTRLS:
+        positionalSetup(parent_temp_JNT, temp_Base_CTRL)
+    for segment, temp_End_CTRL, temp_PV in zip(segments, temp_End_CTRLS, temp_PVS):
+        positionalSetup(temp_JNTS[segment[2]], temp_End_CTRL)
+        positionalSetup(temp_JNTS[segment[1]], temp_PV, segment)
 
-    #REVERSE CONSTRAINT FROM THE TEMP CONTROLS TO THE ORIGINALS 
-   
-    constraint(parent_temp_JNT, parent_CTRL, "orient", True)
-    constraint(middle_temp_JNT, middle_CTRL, "orient", True)
-    constraint(child_temp_JNT, child_CTRL, "orient", True)
-    
-    constraint(parent_CTRL, parent_temp_JNT, "point", True)
-    constraint(temp_IK_CTRL, child_temp_JNT, "orient", True)
+    #ONCE THE BAKE IS DONE, DELETES CONSTRAINTS AND FINISHES THE SETUP
+    def finishSetup():
+        removeConstraints(*temp_JNTS + temp_CTRLS)
 
+        #THE POLE VECTORS ARE PLACED AGAIN ON EVERY FRAME FROM THE BAKED JOINTS. CARRIED BY THE MIDDLE JOINT THEY DRIFT OFF THE PLANE OF THEIR SEGMENT
+        #WHENEVER THE FK BENDS OUT OF IT, WHICH MOVES THE SOLVED JOINTS. MATRICES COME BACK IN CENTIMETERS, SO THE POSITIONS ARE SCALED TO THE SCENE'S UNIT
+        if refPreserveAnimation:
+            frames = [timelineStart + i for i in range(int(timelineEnd - timelineStart) + 1)]
+            unitScale = {"mm": 10.0, "cm": 1.0, "m": 0.01, "km": 0.00001, "in": 1 / 2.54, "ft": 1 / 30.48, "yd": 1 / 91.44, "mi": 1 / 160934.4}[cmds.currentUnit(q=True, linear=True)]
+            for segment, temp_PV in zip(segments, temp_PVS):
+                positions = []
+                for frame in frames:
+                    joints = [[value * unitScale for value in cmds.getAttr(temp_JNTS[i] + ".worldMatrix[0]", time=frame)[12:15]] for i in segment]
+                    #ON A FRAME WHERE THE SEGMENT IS STRAIGHT THERE'S NO PLANE, SO THE POLE VECTOR HOLDS WHERE IT WAS
+                    upper = [b - a for a, b in zip(joints[0], joints[1])]
+                    whole = [b - a for a, b in zip(joints[0], joints[2])]
+                    bend = [upper[1] * whole[2] - upper[2] * whole[1], upper[2] * whole[0] - upper[0] * whole[2], upper[0] * whole[1] - upper[1] * whole[0]]
+                    if sum(value ** 2 for value in bend) < 1e-10 * sum(value ** 2 for value in upper) * sum(value ** 2 for value in whole):
+                        positions.append(positions[-1] if positions else cmds.getAttr(temp_PV + ".translate", time=frame)[0])
+                    else:
+                        position = get_PoleVectorPosition(*joints)
+                        positions.append((position.x, position.y, position.z))
+                for index, axis in enumerate("XYZ"):
+                    writeKeys(temp_PV + ".translate" + axis, frames, [position[index] for position in positions])
+    
+        #CUTS THE TIMELINE UP TO WHERE THE LAST KEYFRAME WAS, FROM THE PREVIOUS CONTROLS
+        lastKeyframe = lastKeyframeComparison(*originalLastKeyframes)
+        lastKeyframeCut(lastKeyframe, *temp_CTRLS)
 
-    #SETS PREFERRED ANGLE ON THE TEMP JOINT CHAIN, AND APPLIES AN IK HANDLE ON IT
-    cmds.joint(parent_temp_JNT, e=True, spa=True, ch=True)
-    temp_IK_Handle = cmds.ikHandle(n=temp_IK_CTRL + "_ikHandle1", sj=parent_temp_JNT, ee=child_temp_JNT)[0]
-    cmds.poleVectorConstraint(temp_PV, temp_IK_Handle)
-    cmds.parent(temp_IK_Handle, temp_IK_CTRL, s=True)
+        #REVERSE CONSTRAINT FROM THE TEMP CONTROLS TO THE ORIGINALS 
+        for ctrl, temp_JNT in zip(fk_CTRLS, temp_JNTS):
+            constraint(temp_JNT, ctrl, "orient", True)
+    
+        constraint(parent_CTRL, parent_temp_JNT, "point", True)
+        for temp_Base_CTRL in temp_Base_CTRLS:
+            constraint(parent_CTRL, temp_Base_CTRL, "point", True)
+            constraint(temp_Base_CTRL, parent_temp_JNT, "orient", True)
+        constraint(temp_IK_CTRL, child_temp_JNT, "orient", True)
+
+
+        #SETS PREFERRED ANGLE ON THE TEMP JOINT CHAIN, AND APPLIES A ROTATE PLANE IK HANDLE ON EVERY SEGMENT OF IT
+        cmds.joint(parent_temp_JNT, e=True, spa=True, ch=True)
+        temp_IK_Handles = []
+        for (start, middle, end), temp_End_CTRL, temp_PV in zip(segments, temp_End_CTRLS, temp_PVS):
+            temp_IK_Handle = cmds.ikHandle(n=tempName(temp_End_CTRL, "_ikHandle1"), sj=temp_JNTS[start], ee=temp_JNTS[end], sol="ikRPsolver")[0]
+            cmds.poleVectorConstraint(temp_PV, temp_IK_Handle)
+            cmds.parent(temp_IK_Handle, temp_End_CTRL, s=True)
+            temp_IK_Handles.append(temp_IK_Handle)
 
     
-    #CLEAN-UP
-    objectsToHide = [parent_CTRL, middle_CTRL, child_CTRL]
-    if refHideOriginalControls:
-        cmds.hide(objectsToHide)
-    cmds.setAttr(parent_temp_JNT + ".visibility", 0)
-    cmds.setAttr(temp_IK_Handle + ".visibility", 0)
-    filterCurve_staticChannels(temp_IK_CTRL)
-    filterCurve_staticChannels(temp_PV)
-    cmds.lockNode(temp_IK_Group)
+        #CLEAN-UP
+        objectsToHide = fk_CTRLS
+        if refHideOriginalControls:
+            cmds.hide(objectsToHide)
+        cmds.setAttr(parent_temp_JNT + ".visibility", 0)
+        for temp_IK_Handle in temp_IK_Handles:
+            cmds.setAttr(temp_IK_Handle + ".visibility", 0)
+        for proxy, ctrl in zip(temp_IK_Proxies[len(fk_CTRLS):], temp_CTRLS):
+            filterCurve_staticChannels(ctrl, temp_JNTS)
+            storeSnapshot(proxy, ctrl)
+        cmds.lockNode(temp_IK_Group)
 
     
-    #LINK THE UI SLIDER TO THE LOCAL SCALE OF THE CONTROLS, SO THE USER CAN ADJUST THEM MANUALLY BASED ON THE RIG 
-    refControlSize = cmds.floatSliderGrp("ControlSize_FloatSlider", q=True, v=True)
-    cmds.connectControl("ControlSize_FloatSlider", temp_IK_CTRL + "Shape.localScaleX", temp_IK_CTRL + "Shape.localScaleY", temp_IK_CTRL + "Shape.localScaleZ",
-    temp_PV + "Shape.localScaleX", temp_PV + "Shape.localScaleY", temp_PV + "Shape.localScaleZ")
-    adjustControlSize(refControlSize, temp_IK_CTRL, temp_PV)
+        #LINK THE UI SLIDER TO THE LOCAL SCALE OF THE CONTROLS, SO THE USER CAN ADJUST THEM MANUALLY BASED ON THE RIG 
+        refControlSize = cmds.floatSliderGrp("ControlSize_FloatSlider", q=True, v=True)
+        cmds.connectControl("ControlSize_FloatSlider", *controlSizeAttributes(*temp_CTRLS))
+        adjustControlSize(refControlSize, *temp_CTRLS)
     
-    cmds.select(temp_IK_CTRL)
+        cmds.select(temp_IK_CTRL)
+        verifyAccuracy(verificationReference, timelineStart, timelineEnd)
+
+    #BAKES THE ANIMATION DATA FOR THE WHOLE CHAIN IN ONE PASS. IF A BACKGROUND BAKE GETS CANCELLED, THE HALF-BUILT SETUP IS REMOVED
+    if refPreserveAnimation:
+        bakeControls(temp_JNTS + temp_CTRLS, timelineStart, timelineEnd, finishSetup, lambda: deleteSetupNodes(temp_IK_Group))
+    else:
+        finishSetup()
     
         
 #CREATES A TEMPORARY FK SET-UP BY SELECTING EXISTING IK CONTROLS
@@ -239,7 +1065,7 @@ def ik_To_FK():
     timelineEnd = cmds.playbackOptions(max=True, q=True)
     cmds.currentTime(timelineStart, e=True)
     
-    #FROM THE POLE VECTOR, WE DERIVE THE SELECTION OF THE PARENT AND MIDDLE JOINT THAT THE IK HANDLE INFLUENCES, AND STORE THEM IN VARIABLES
+    #FROM THE POLE VECTOR, WE DERIVE THE SELECTION OF THE JOINTS THAT THE IK HANDLE INFLUENCES, AND STORE THEM IN VARIABLES
     cmds.select(poleVector, hi=True)
     poleVectorHierarchy = cmds.ls(sl=True)
     
@@ -253,153 +1079,191 @@ def ik_To_FK():
 
     jointList = cmds.ikHandle(ikHandle, q=True, jl=True)
     parent_JNT = jointList[0]
-    middle_JNT = jointList[1]
+    verificationReference = verificationSamples(jointList + [ikControl, poleVector], timelineStart, timelineEnd)
   
     
-    #CREATE 3 TEMP LOCATORS, ADD A GROUP ON TOP OF THEM AND PARENT THEM TO EACH OTHER
-    temp_FK_Group = cmds.group(em=True, n=parent_JNT + "_temp_FK_Group")
-        
-    temp_parent_FK_CTRL = cmds.spaceLocator(n=parent_JNT + "_temp_parent_FK_CTRL")[0]
-    locatorSize(temp_parent_FK_CTRL)
-    temp_parent_FK_CTRL_GRP = cmds.group(temp_parent_FK_CTRL, n=temp_parent_FK_CTRL + "_GRP")
-    cmds.parent(temp_parent_FK_CTRL_GRP, temp_FK_Group)
-    
-    temp_middle_FK_CTRL = cmds.spaceLocator(n=middle_JNT + "_temp_middle_FK_CTRL")[0]
-    locatorSize(temp_middle_FK_CTRL)
-    temp_middle_FK_CTRL_GRP = cmds.group(temp_middle_FK_CTRL, n=temp_middle_FK_CTRL + "_GRP")
-    cmds.parent(temp_middle_FK_CTRL_GRP, temp_parent_FK_CTRL)
-
-    temp_child_FK_CTRL = cmds.spaceLocator(n=ikControl + "_temp_child_FK_CTRL")[0]
-    locatorSize(temp_child_FK_CTRL)
-    temp_child_FK_CTRL_GRP = cmds.group(temp_child_FK_CTRL, n=temp_child_FK_CTRL + "_GRP")
-    cmds.parent(temp_child_FK_CTRL_GRP, temp_middle_FK_CTRL)
-    
-    temp_poleVector_CTRL = cmds.spaceLocator(n=poleVector + "_temp_poleVector_CTRL")[0]
-    temp_poleVector_CTRL_GRP = cmds.group(temp_poleVector_CTRL, n=temp_poleVector_CTRL + "_GRP")
+    #CREATE A TEMP LOCATOR FOR EVERY JOINT IN THE CHAIN PLUS THE IK CONTROL, ADD A GROUP ON TOP OF THEM AND PARENT THEM TO EACH OTHER
+    temp_FK_Group = cmds.group(em=True, n=tempName(parent_JNT, "_temp_FK_Group"))
+    registerSetup(temp_FK_Group, "FK", timelineStart, timelineEnd)
+
+    temp_FK_CTRLS = []
+    temp_FK_CTRL_GRPS = []
+    for index, obj in enumerate(jointList + [ikControl]):
+        role = "parent" if index == 0 else "child" if index == len(jointList) else "middle"
+        temp_FK_CTRL = cmds.spaceLocator(n=tempName(obj, "_temp_" + role + "_FK_CTRL"))[0]
+        locatorSize(temp_FK_CTRL)
+        temp_FK_CTRL_GRP = cmds.group(temp_FK_CTRL, n=tempName(temp_FK_CTRL, "_GRP"))
+        cmds.parent(temp_FK_CTRL_GRP, temp_FK_CTRLS[-1] if temp_FK_CTRLS else temp_FK_Group)
+        temp_FK_CTRLS.append(temp_FK_CTRL)
+        temp_FK_CTRL_GRPS.append(temp_FK_CTRL_GRP)
+    temp_parent_FK_CTRL = temp_FK_CTRLS[0]
+    temp_child_FK_CTRL = temp_FK_CTRLS[-1]
+    
+    temp_poleVector_CTRL = cmds.spaceLocator(n=tempName(poleVector, "_temp_poleVector_CTRL"))[0]
+    temp_poleVector_CTRL_GRP = cmds.group(temp_poleVector_CTRL, n=tempName(temp_poleVector_CTRL, "_GRP"))
     cmds.parent(temp_poleVector_CTRL_GRP, temp_parent_FK_CTRL)
     
-    temp_FK_Contents = [ikControl, poleVector, ikHandle[0], temp_parent_FK_CTRL, temp_middle_FK_CTRL, temp_child_FK_CTRL, temp_poleVector_CTRL]
+    temp_FK_Contents = [ikControl, poleVector, ikHandle[0]] + temp_FK_CTRLS + [temp_poleVector_CTRL]
     
     
-    #CREATES EMPTY GROUPS AS PROXIES FOR REFERENCING THE ACTUAL CONTROLS LATER ON
+    #CREATES EMPTY GROUPS AS PROXIES FOR REFERENCING THE ACTUAL CONTROLS LATER ON, AND SNAPSHOTS THE ORIGINAL CURVES ON THEM
+    temp_FK_Proxies = []
     for obj in temp_FK_Contents:
-        cmds.group(n=obj + "_temp_FK_Name", em=True, p=temp_FK_Group)
+        temp_FK_Proxies.append(createProxy(obj, "_temp_FK_Name", temp_FK_Group))
+    storeSnapshot(temp_FK_Proxies[0], ikControl, *temp_FK_CTRLS)
+    storeSnapshot(temp_FK_Proxies[1], poleVector, temp_parent_FK_CTRL, temp_poleVector_CTRL)
         
-    hideAttributes("translate", temp_parent_FK_CTRL, temp_middle_FK_CTRL, temp_child_FK_CTRL)
-    hideAttributes("scale", temp_parent_FK_CTRL, temp_middle_FK_CTRL, temp_child_FK_CTRL)
+    hideAttributes("translate", *temp_FK_CTRLS)
+    hideAttributes("scale", *temp_FK_CTRLS)
     
     original_RO = cmds.getAttr(ikControl + ".rotateOrder")
 
     
-    #SNAPS THE TEMP CONTROLS TO THE POSITION OF THE ORIGINAL CO NTROLS, BAKES THE ANIMATION DATA, THEN DELETES CONSTRAINTS
+    #SNAPS THE TEMP CONTROLS TO THE POSITION OF THE ORIGINAL CONTROLS AND CONSTRAINS THEM, SO THEY CAN ALL BE BAKED TOGETHER AFTERWARDS
     def positionalSetup(parent, group, child):
         cmds.setAttr(child + ".rotateOrder", original_RO)
         cmds.matchTransform(group, parent, position=True, rotation=True)     
         constraint(parent, child, "parent", True) 
-        cmds.select(child)
         lastKeyframe = cmds.findKeyframe(parent, which="last")
-        if refPreserveAnimation:
-            cmds.bakeResults(t=(timelineStart, timelineEnd))
-        cmds.delete(cmds.listRelatives(type="constraint"))
         return lastKeyframe
 
-    positionalSetup(parent_JNT, temp_parent_FK_CTRL_GRP, temp_parent_FK_CTRL)
-    positionalSetup(middle_JNT, temp_middle_FK_CTRL_GRP, temp_middle_FK_CTRL)
-    ikControlLastKeyframe = positionalSetup(ikControl, temp_child_FK_CTRL_GRP, temp_child_FK_CTRL)
+    for joint, temp_FK_CTRL_GRP, temp_FK_CTRL in zip(jointList, temp_FK_CTRL_GRPS, temp_FK_CTRLS):
+        positionalSetup(joint, temp_FK_CTRL_GRP, temp_FK_CTRL)
+    ikControlLastKeyframe = positionalSetup(ikControl, temp_FK_CTRL_GRPS[-1], temp_child_FK_CTRL)
     poleVectorLastKeyframe = positionalSetup(poleVector, temp_poleVector_CTRL_GRP, temp_poleVector_CTRL)
 
-    #CUTS THE TIMELINE UP TO WHERE THE LAST KEYFRAME WAS, FROM THE PREVIOUS CONTROLS
-    lastKeyframe = lastKeyframeComparison(ikControlLastKeyframe, poleVectorLastKeyframe)
-    lastKeyframeCut(lastKeyframe, temp_parent_FK_CTRL, temp_middle_FK_CTRL, temp_child_FK_CTRL)
+    #ONCE THE BAKE IS DONE, DELETES CONSTRAINTS AND FINISHES THE SETUP
+    def finishSetup():
+        removeConstraints(*temp_FK_CTRLS + [temp_poleVector_CTRL])
+
+        #CUTS THE TIMELINE UP TO WHERE THE LAST KEYFRAME WAS, FROM THE PREVIOUS CONTROLS
+        lastKeyframe = lastKeyframeComparison(ikControlLastKeyframe, poleVectorLastKeyframe)
+        lastKeyframeCut(lastKeyframe, *temp_FK_CTRLS)
 
-    #REVERSE CONSTRAINT FROM THE TEMP CONTROLS TO THE ORIGINALS 
-    constraint(temp_parent_FK_CTRL, parent_JNT, "orient", True)
-    constraint(temp_middle_FK_CTRL, middle_JNT, "orient", True)
-    constraint(temp_child_FK_CTRL, ikControl, "parent", True)
+        #REVERSE CONSTRAINT FROM THE TEMP CONTROLS TO THE ORIGINALS 
+        for temp_FK_CTRL, joint in zip(temp_FK_CTRLS, jointList):
+            constraint(temp_FK_CTRL, joint, "orient", True)
+        constraint(temp_child_FK_CTRL, ikControl, "parent", True)
     
-    constraint(parent_JNT, temp_parent_FK_CTRL, "point", True)
-    constraint(temp_poleVector_CTRL, poleVector, "point", True)
-    constraint(temp_parent_FK_CTRL, temp_poleVector_CTRL, "parent", True)
+        constraint(parent_JNT, temp_parent_FK_CTRL, "point", True)
+        constraint(temp_poleVector_CTRL, poleVector, "point", True)
+        constraint(temp_parent_FK_CTRL, temp_poleVector_CTRL, "parent", True)
 
     
-    #CLEAN-UP
-    cmds.setAttr(ikHandle[0] + ".ikBlend", 0)
-    objectsToHide = [poleVector, ikControl]
-    if refHideOriginalControls:
-        cmds.hide(objectsToHide)
-    cmds.setAttr(temp_poleVector_CTRL + ".visibility", 0)
-    cmds.lockNode(temp_FK_Group)
+        #CLEAN-UP
+        cmds.setAttr(ikHandle[0] + ".ikBlend", 0)
+        objectsToHide = [poleVector, ikControl]
+        if refHideOriginalControls:
+            cmds.hide(objectsToHide)
+        cmds.setAttr(temp_poleVector_CTRL + ".visibility", 0)
+        cmds.lockNode(temp_FK_Group)
     
-    filterCurve_staticChannels(temp_parent_FK_CTRL)
-    filterCurve_staticChannels(temp_middle_FK_CTRL)
-    filterCurve_staticChannels(temp_child_FK_CTRL)
+        for temp_FK_CTRL in temp_FK_CTRLS:
+            filterCurve_staticChannels(temp_FK_CTRL, temp_FK_CTRLS)
+        for proxy, obj in zip(temp_FK_Proxies[3:], temp_FK_Contents[3:]):
+            storeSnapshot(proxy, obj)
     
     
-    #LINK THE UI SLIDER TO THE LOCAL SCALE OF THE CONTROLS, SO THE USER CAN ADJUST THEM MANUALLY BASED ON THE RIG 
-    refControlSize = cmds.floatSliderGrp("ControlSize_FloatSlider", q=True, v=True)
-    cmds.connectControl("ControlSize_FloatSlider", temp_parent_FK_CTRL + "Shape.localScaleX", temp_parent_FK_CTRL + "Shape.localScaleY", temp_parent_FK_CTRL + "Shape.localScaleZ",
-    temp_middle_FK_CTRL + "Shape.localScaleX", temp_middle_FK_CTRL + "Shape.localScaleY", temp_middle_FK_CTRL + "Shape.localScaleZ",
-    temp_child_FK_CTRL + "Shape.localScaleX", temp_child_FK_CTRL + "Shape.localScaleY", temp_child_FK_CTRL + "Shape.localScaleZ")
-    adjustControlSize(refControlSize, temp_parent_FK_CTRL, temp_middle_FK_CTRL, temp_child_FK_CTRL)
+        #LINK THE UI SLIDER TO THE LOCAL SCALE OF THE CONTROLS, SO THE USER CAN ADJUST THEM MANUALLY BASED ON THE RIG 
+        refControlSize = cmds.floatSliderGrp("ControlSize_FloatSlider", q=True, v=True)
+        cmds.connectControl("ControlSize_FloatSlider", *controlSizeAttributes(*temp_FK_CTRLS))
+        adjustControlSize(refControlSize, *temp_FK_CTRLS)
     
-    cmds.select(temp_parent_FK_CTRL)
+        cmds.select(temp_parent_FK_CTRL)
+        verifyAccuracy(verificationReference, timelineStart, timelineEnd)
+
+    #BAKES THE ANIMATION DATA FOR THE WHOLE CHAIN IN ONE PASS. IF A BACKGROUND BAKE GETS CANCELLED, THE HALF-BUILT SETUP IS REMOVED
+    if refPreserveAnimation:
+        bakeControls(temp_FK_CTRLS + [temp_poleVector_CTRL], timelineStart, timelineEnd, finishSetup, lambda: deleteSetupNodes(temp_FK_Group))
+    else:
+        finishSetup()
     
     
-def deleteSetup():
-#RESTORES THE PREVIOUS SET-UP 
+def deleteSetup(temp_Group=None, preserveAnimation=None):
+#RESTORES THE PREVIOUS SET-UP. THE SETUP AND WHETHER TO PRESERVE ITS ANIMATION CAN BE PASSED IN, LIKE FROM THE SETUP LIST, OTHERWISE THEY COME FROM THE SELECTION AND THE UI
    
-    refPreserveAnimation = cmds.checkBoxGrp("PreserveAnimation_CheckBox", q=True, v1=True)
+    refPreserveAnimation = cmds.checkBoxGrp("PreserveAnimation_CheckBox", q=True, v1=True) if preserveAnimation is None else preserveAnimation
+    refOutputToLayer = cmds.checkBoxGrp("OutputToLayer_CheckBox", q=True, v1=True)
     refHideOriginalControls = cmds.checkBoxGrp("HideOriginalControls_CheckBox", q=True, v1=True)
     
     #QUERIES THE START AND END FRAME OF THE CURRENT TIMELINE
     timelineStart = cmds.playbackOptions(min=True, q=True)
     timelineEnd = cmds.playbackOptions(max=True, q=True)
     
-    #BAKES THE PREVIOUS CONTROLS, CLEANS UP THE CURVES, DELETES CURRENT CONTROLS AND BRINGS BACK ORIGINALS
-    def cleanUp():
-        control = group_Contents[i][:-13]
-        cmds.select(control)
-        if refPreserveAnimation:
-            cmds.bakeResults(t = (timelineStart, timelineEnd))
-            lastKeyframeCut(lastKeyframe, control)
-        cmds.showHidden(control)
-                    
-        filterCurve_staticChannels(control)
-    
-    temp_Selection = cmds.ls(sl=True)
-    if len(temp_Selection) == 0:
-        assistMessage("<hl>To delete a temporary setup, you have to select one of its controls.<hl>", 2500)
+    #AN ORIGINAL CONTROL CAN SKIP THE BAKE WHEN NONE OF THE TEMP CONTROLS DRIVING IT HAVE BEEN EDITED
+    def isRestorable(proxy):
+        if not cmds.attributeQuery("snapshotCurves", node=proxy, exists=True):
+            return False
+        if not refPreserveAnimation:
+            return True
+        drivers = cmds.ls(cmds.listConnections(proxy + ".drivers", s=True, d=False) or [], long=True)
+        return all(isUntouched(driverProxy) for driverProxy in proxies if proxyTarget(driverProxy) in drivers)
+
+    #BAKES THE PREVIOUS CONTROLS IN ONE PASS, CLEANS UP THE CURVES, DELETES CURRENT CONTROLS AND BRINGS BACK ORIGINALS
+    def cleanUp(originalProxies, chain, onFinish):
+        restoredProxies = [proxy for proxy in originalProxies if isRestorable(proxy)]
+        #WITH THE LAYER OUTPUT, THE EDITED ORIGINALS GO INTO A LAYER ON TOP OF THEIR SNAPSHOT. OLDER SETUPS WITHOUT ONE STILL GET BAKED
+        layerProxies = [proxy for proxy in originalProxies if proxy not in restoredProxies and cmds.attributeQuery("snapshotCurves", node=proxy, exists=True)] if refPreserveAnimation and refOutputToLayer else []
+        bakedControls = [proxyTarget(proxy) for proxy in originalProxies if proxy not in restoredProxies and proxy not in layerProxies]
+
+        #THE LAYER OUTPUT MAY SAMPLE IN THE BACKGROUND, SO THE REST OF THE CLEAN-UP CARRIES ON ONCE IT'S WRITTEN
+        def finishCleanUp(samples=None):
+            if layerProxies:
+                outputToLayer(layerProxies, timelineStart, timelineEnd, restoreOriginals, samples)
+            else:
+                restoreOriginals()
+
+        def restoreOriginals():
+            for proxy in restoredProxies:
+                channels = drivenChannels(proxyTarget(proxy), temp_Group)
+                removeConstraints(proxyTarget(proxy))
+                restoreCurves(proxy, channels)
+            if refPreserveAnimation and bakedControls:
+                lastKeyframeCut(lastKeyframe, *bakedControls)
+            for proxy in originalProxies:
+                cmds.showHidden(proxyTarget(proxy))
+            for control in bakedControls:
+                filterCurve_staticChannels(control, chain)
+            onFinish()
+
+        #THE LAYER ORIGINALS ARE SAMPLED IN THE SAME BAKE AS THE OTHERS, SO CANCELLING IT LEAVES ALL OF THEM UNTOUCHED
+        if refPreserveAnimation and bakedControls:
+            bakeControls(bakedControls, timelineStart, timelineEnd, finishCleanUp, extraPlugs=layerPlugs(layerProxies))
+        else:
+            finishCleanUp()
+
+    #DELETES THE TEMP SETUP ONCE THE ORIGINALS HAVE THEIR ANIMATION BACK
+    def removeSetup():
+        if setupType == "FK":
+            removeConstraints(*cmds.ikHandle(proxyTarget(proxies[2]), q=True, jointList=True))  #THE IK JOINTS ARE DRIVEN BY THE TEMP CONTROLS, BUT AREN'T PART OF THE GROUP
+            cmds.setAttr(proxyTarget(proxies[2]) + ".ikBlend", 1)
+        cmds.connectControl("ControlSize_FloatSlider", "")
+        deleteSetupNodes(temp_Group)
+        verifyAccuracy(verificationReference, timelineStart, timelineEnd)
+    
+    #ANY NODE OF THE SETUP CAN BE SELECTED, THE GROUP IS FOUND BY WALKING UP THE HIERARCHY
+    if temp_Group is None:
+        temp_Selection = cmds.ls(sl=True)
+        if len(temp_Selection) == 0:
+            assistMessage("<hl>To delete a temporary setup, you have to select one of its controls.<hl>", 2500)
+        temp_Group = setupGroup(temp_Selection[0])
+        if temp_Group is None:
+            assistMessage("<hl>Incorrect selection. To delete a temporary IK or FK setup, select one of its controls and then click the button.<hl>", 4500)
+    setupType = setupKind(temp_Group)
+    proxies = setupProxies(temp_Group)
         
-    if "FK_CTRL" in temp_Selection[0] or "temp_IK_CTRL" in temp_Selection[0] or "temp_PV" in temp_Selection[0]:
-        for i in range(6):
-            cmds.pickWalk(d="up")
-        temp_Group = cmds.ls(sl=True)[0]
-        if "temp_IK_Group" in temp_Group or "temp_FK_Group" in temp_Group:
-            group_Contents = cmds.listRelatives(temp_Group)
-                
-            if "temp_IK_Group" in temp_Group:
-                ikControlLastKeyframe = cmds.findKeyframe(group_Contents[6][:-13], which="last")
-                poleVectorLastKeyframe = cmds.findKeyframe(group_Contents[7][:-13], which="last")
-                
-                lastKeyframe = lastKeyframeComparison(ikControlLastKeyframe, poleVectorLastKeyframe)
-                for i in range(3,6):
-                    cleanUp()
-                    
-            elif "temp_FK_Group" in temp_Group:
-                parentLastKeyframe = cmds.findKeyframe(group_Contents[4][:-13], which="last")
-                middleLastKeyframe = cmds.findKeyframe(group_Contents[5][:-13], which="last")
-                childLastKeyframe = cmds.findKeyframe(group_Contents[6][:-13], which="last")
-
-                lastKeyframe = lastKeyframeComparison(parentLastKeyframe, middleLastKeyframe, childLastKeyframe)
-                for i in range(1,3):
-                    cleanUp()
-                cmds.setAttr(group_Contents[3][:-13] + ".ikBlend", 1)
-                
-            cmds.connectControl("ControlSize_FloatSlider", "")
-            cmds.lockNode(temp_Group, l=False)
-            cmds.delete(temp_Group)  
+    if setupType == "IK":
+        #A LONGER CHAIN HAS AN END CONTROL AND A POLE VECTOR FOR EVERY SEGMENT, SO THE TEMP CONTROLS ARE TOLD APART FROM THE ORIGINALS BY THE GROUP THEY LIVE IN
+        tempProxies = setupTemps(temp_Group)
+        originalProxies = [proxy for proxy in proxies if proxy not in tempProxies]
+        lastKeyframe = lastKeyframeComparison(*[cmds.findKeyframe(proxyTarget(proxy), which="last") for proxy in tempProxies])
+        verificationReference = verificationSamples([proxyTarget(proxy) for proxy in originalProxies], timelineStart, timelineEnd)
+        cleanUp(originalProxies, [proxyTarget(proxy) for proxy in originalProxies], removeSetup)
+            
     else:
-        assistMessage("<hl>Incorrect selection. To delete a temporary IK or FK setup, select one of its controls and then click the button.<hl>", 4500)
+        lastKeyframe = lastKeyframeComparison(*[cmds.findKeyframe(proxyTarget(proxy), which="last") for proxy in proxies[3:-1]])
+        verificationReference = verificationSamples(cmds.ikHandle(proxyTarget(proxies[2]), q=True, jointList=True) + [proxyTarget(proxy) for proxy in proxies[:2]], timelineStart, timelineEnd)
+        cleanUp(proxies[:2], cmds.ikHandle(proxyTarget(proxies[2]), q=True, jointList=True), removeSetup)
     
 
 def generateCode():
@@ -410,7 +1274,6 @@ def generateCode():
 #THIS FIRST BLOCK OF CODE GETS GENERATED FOR ALL
     code = """
 import maya.cmds as cmds
-import maya.OpenMaya as om
 from sys import exit
 
 refRemoveStaticChannels = """ + str(cmds.checkBoxGrp("RemoveStaticChannels_CheckBox", q=True, v1=True)) + """
@@ -431,7 +1294,7 @@ def filterCurve_staticChannels(control):
 
 #GATHERS THE LAST KEYFRAME OF EVERY ORIGINAL CONTROL AND COMPARES TO SEE WHICH ONE WAS THE FURTHEST IN THE TIMELINE
 def lastKeyframeComparison(*keyframes):
-    lastKeyframe = max(*keyframes)
+    lastKeyframe = max(keyframes)
     return lastKeyframe
     
 #FOR EVERY NEW CONTROL CREATED, WE CUT ITS TIMELINE UP TO WHERE THE LAST KEYFRAME OF THE PREVIOUS CONTROL WAS 
@@ -501,14 +1364,14 @@ cmds.select(cl=True)
             code += """
 fk_CTRLS = cmds.ls(sl=True)
 if len(fk_CTRLS) != 3:
-    assistMessage("<hl>Incorrect number of controls selected. To apply an IK setup, you need to select 3 FK controls, in order of parent to child.<hl>", 5000)
+    assistMessage("<hl>Incorrect number of controls selected. The generated IK setup works on 3 FK controls, selected in order of parent to child. For longer chains, use the FK to IK button.<hl>", 5000)
 parent_CTRL = fk_CTRLS[0]
 middle_CTRL = fk_CTRLS[1]
 child_CTRL = fk_CTRLS[2]
 cmds.select(cl=True)
 """
         else:
-            assistMessage("<hl>Incorrect number of controls selected. For a specific IK setup, select 3 FK controls. For a generic setup, have no selections.<hl>", 5000)
+            assistMessage("<hl>Incorrect number of controls selected. For a specific IK setup, select 3 FK controls, the generated code only handles 3 joint chains. For a generic setup, have no selections.<hl>", 5000)
                 
         code +="""
 #QUERIES THE START AND END FRAME OF THE CURRENT TIMELINE
@@ -534,6 +1397,12 @@ original_RO = cmds.getAttr(child_CTRL + ".rotateOrder")
 temp_IK_Contents = [parent_CTRL, middle_CTRL, child_CTRL, temp_IK_CTRL, temp_PV]
 temp_IK_Group = cmds.group(parent_temp_JNT, temp_IK_CTRL, temp_PV, n=parent_CTRL + "_temp_IK_Group")
 
+#TAGS THE GROUP, SO THE SETUP CAN BE FOUND BY ITS ATTRIBUTES INSTEAD OF ITS NAME
+cmds.addAttr(temp_IK_Group, ln="ikfkSetup", dt="string")
+cmds.setAttr(temp_IK_Group + ".ikfkSetup", "IK", type="string")
+cmds.addAttr(temp_IK_Group, ln="bakeStart", at="double", dv=timelineStart)
+cmds.addAttr(temp_IK_Group, ln="bakeEnd", at="double", dv=timelineEnd)
+
 
 #CREATES EMPTY GROUPS AS PROXIES FOR REFERENCING THE ACTUAL CONTROLS LATER ON
 for obj in temp_IK_Contents:
@@ -541,6 +1410,7 @@ for obj in temp_IK_Contents:
    
 
 def get_PoleVectorPosition(pos_Parent, pos_Middle, pos_Child):
+    import maya.OpenMaya as om
     vector_parentJoint = om.MVector(pos_Parent[0], pos_Parent[1], pos_Parent[2])
     vector_middleJoint = om.MVector(pos_Middle[0], pos_Middle[1], pos_Middle[2])
     vector_childJoint = om.MVector(pos_Child[0], pos_Child[1], pos_Child[2])
@@ -676,12 +1546,18 @@ for obj in poleVectorHierarchy:
         assistMessage("<hl>Couldn't obtain IK handle from the rig. Selection order must be Pole Vector first, then IK control. Otherwise script may not work with this rig.<hl>", 4000)       
 
 jointList = cmds.ikHandle(ikHandle, q=True, jl=True)
+if len(jointList) != 2:
+    assistMessage("<hl>The generated FK setup works on IK handles that drive 3 joints. For longer chains, use the IK to FK button.<hl>", 5000)
 parent_JNT = jointList[0]
 middle_JNT = jointList[1]
 
 
 #CREATE 3 TEMP LOCATORS, ADD A GROUP ON TOP OF THEM AND PARENT THEM TO EACH OTHER
 temp_FK_Group = cmds.group(em=True, n=parent_JNT + "_temp_FK_Group")
+cmds.addAttr(temp_FK_Group, ln="ikfkSetup", dt="string")
+cmds.setAttr(temp_FK_Group + ".ikfkSetup", "FK", type="string")
+cmds.addAttr(temp_FK_Group, ln="bakeStart", at="double", dv=timelineStart)
+cmds.addAttr(temp_FK_Group, ln="bakeEnd", at="double", dv=timelineEnd)
     
 temp_parent_FK_CTRL = cmds.spaceLocator(n=parent_JNT + "_temp_parent_FK_CTRL")[0]
 locatorSize(temp_parent_FK_CTRL)
@@ -779,9 +1655,40 @@ refHideOriginalControls = """ + str(cmds.checkBoxGrp("HideOriginalControls_Check
 timelineStart = cmds.playbackOptions(min=True, q=True)
 timelineEnd = cmds.playbackOptions(max=True, q=True)
 
+#FINDS THE CONTROL A PROXY STANDS FOR, THROUGH ITS MESSAGE CONNECTION OR, FOR OLDER SETUPS, ITS NAME
+def proxyTarget(proxy):
+    if cmds.attributeQuery("target", node=proxy, exists=True):
+        return cmds.ls(cmds.listConnections(proxy + ".target", s=True, d=False), long=True)[0]
+    return proxy.split("|")[-1][:-13]
+
+#WALKS UP FROM ANY NODE OF A SETUP TO ITS GROUP, WHICH IS TAGGED WITH AN ikfkSetup ATTRIBUTE. OLDER SETUPS ARE RECOGNISED BY THEIR NAME
+def setupGroup(node):
+    hierarchy = cmds.ls(node, long=True)[0].split("|")
+    for i in range(len(hierarchy), 1, -1):
+        if cmds.attributeQuery("ikfkSetup", node="|".join(hierarchy[:i]), exists=True):
+            return "|".join(hierarchy[:i])
+    if len(hierarchy) > 1 and ("temp_IK_Group" in hierarchy[1] or "temp_FK_Group" in hierarchy[1]):
+        return "|" + hierarchy[1]
+    return None
+
+def setupKind(group):
+    if cmds.attributeQuery("ikfkSetup", node=group, exists=True):
+        return cmds.getAttr(group + ".ikfkSetup")
+    return "IK" if "temp_IK_Group" in group.split("|")[-1] else "FK"
+
+#DELETES THE CONSTRAINTS DRIVING THE CONTROLS, AS WELL AS THE MATRIX NETWORKS LINKED TO THEM WHEN MATRIX CONNECTIONS ARE ON
+def removeConstraints(*controls):
+    for control in controls:
+        constraints = cmds.listRelatives(control, type="constraint")
+        if constraints:
+            cmds.delete(constraints)
+        matrixNodes = [plug.split(".")[0] for plug in cmds.listConnections(control + ".message", s=False, d=True, plugs=True) or [] if plug.endswith(".tempConstraint")]
+        if matrixNodes:
+            cmds.delete(matrixNodes)
+
 #BAKES THE PREVIOUS CONTROLS, CLEANS UP THE CURVES, DELETES CURRENT CONTROLS AND BRINGS BACK ORIGINALS
 def cleanUp():
-    control = group_Contents[i][:-13]
+    control = proxyTarget(proxies[i])
     cmds.select(control)
     if refPreserveAnimation:
         cmds.bakeResults(t = (timelineStart, timelineEnd))
@@ -792,13 +1699,11 @@ def cleanUp():
     
         temp_Selection = cmds.ls(sl=True)
         if len(temp_Selection) > 0:
-            if "FK_CTRL" in temp_Selection[0] or "temp_IK_CTRL" in temp_Selection[0] or "temp_PV" in temp_Selection[0]:
-                for i in range(6):
-                    cmds.pickWalk(d="up")
-            else:
+            temp_Group = setupGroup(temp_Selection[0])
+            if temp_Group is None:
                 assistMessage("<hl>Incorrect selection. To generate the code for deleting an IK or FK setup, select one of its controls and then click the button.<hl>", 4500)
             code+="""  
-temp_Group = """ "\"" + cmds.ls(sl=True)[0] + "\"" """
+temp_Group = """ "\"" + temp_Group + "\"" """
 if cmds.objExists(temp_Group) == False:
     assistMessage("<hl>There's no setup to be deleted.<hl>", 5000)"""
         
@@ -807,38 +1712,40 @@ if cmds.objExists(temp_Group) == False:
 temp_Selection = cmds.ls(sl=True)
 if len(temp_Selection) == 0:
         assistMessage("<hl>To delete a temporary setup, you have to select one of its controls.<hl>", 4500)
-if "FK_CTRL" in temp_Selection[0] or "temp_IK_CTRL" in temp_Selection[0] or "temp_PV" in temp_Selection[0]:
-    for i in range(6):
-        cmds.pickWalk(d="up")
-else:
+temp_Group = setupGroup(temp_Selection[0])
+if temp_Group is None:
     assistMessage("<hl>Incorrect selection. To delete a temporary IK or FK setup, select one of its controls and then execute.<hl>", 4500)
-
-temp_Group = cmds.ls(sl=True)[0] """    
+"""    
 
         code +="""
-group_Contents = cmds.listRelatives(temp_Group)
+group_Contents = cmds.listRelatives(temp_Group, fullPath=True)
+proxies = [obj for obj in group_Contents if cmds.attributeQuery("target", node=obj, exists=True) or obj.endswith("_temp_IK_Name") or obj.endswith("_temp_FK_Name")]
         
-if "temp_IK_Group" in temp_Group:
-    ikControlLastKeyframe = cmds.findKeyframe(group_Contents[6][:-13], which="last")
-    poleVectorLastKeyframe = cmds.findKeyframe(group_Contents[7][:-13], which="last")
-    
-    lastKeyframe = lastKeyframeComparison(ikControlLastKeyframe, poleVectorLastKeyframe)
-    for i in range(3,6):
-        cleanUp()
+if setupKind(temp_Group) == "IK":
+    #A LONGER CHAIN HAS AN END CONTROL AND A POLE VECTOR FOR EVERY SEGMENT, SO THE TEMP CONTROLS ARE TOLD APART FROM THE ORIGINALS BY THE GROUP THEY LIVE IN
+    tempProxies = [proxy for proxy in proxies if setupGroup(proxyTarget(proxy)) == cmds.ls(temp_Group, long=True)[0]]
+    lastKeyframe = lastKeyframeComparison(*[cmds.findKeyframe(proxyTarget(proxy), which="last") for proxy in tempProxies])
+    for i in range(len(proxies)):
+        if proxies[i] not in tempProxies:
+            cleanUp()
         
 
-elif "temp_FK_Group" in temp_Group:
-    parentLastKeyframe = cmds.findKeyframe(group_Contents[4][:-13], which="last")
-    middleLastKeyframe = cmds.findKeyframe(group_Contents[5][:-13], which="last")
-    childLastKeyframe = cmds.findKeyframe(group_Contents[6][:-13], which="last")
-
-    lastKeyframe = lastKeyframeComparison(parentLastKeyframe, middleLastKeyframe, childLastKeyframe)
-    for i in range(1,3):
+elif setupKind(temp_Group) == "FK":
+    lastKeyframe = lastKeyframeComparison(*[cmds.findKeyframe(proxyTarget(proxy), which="last") for proxy in proxies[3:-1]])
+    for i in range(2):
         cleanUp()
-    cmds.setAttr(group_Contents[3][:-13] + ".ikBlend", 1)
-
+    removeConstraints(*cmds.ikHandle(proxyTarget(proxies[2]), q=True, jointList=True))  #THE IK JOINTS ARE DRIVEN BY THE TEMP CONTROLS, BUT AREN'T PART OF THE GROUP
+    cmds.setAttr(proxyTarget(proxies[2]) + ".ikBlend", 1)
+
+#THE MATRIX NETWORKS AND THE CURVE SNAPSHOTS OF THE ORIGINALS LIVE OUTSIDE OF THE GROUP, SO THEY'RE DELETED ALONG WITH IT
+setupNodes = [temp_Group]
+if cmds.attributeQuery("networkNodes", node=temp_Group, exists=True):
+    setupNodes += cmds.listConnections(temp_Group + ".networkNodes", s=True, d=False) or []
+for proxy in proxies:
+    if cmds.attributeQuery("snapshotCurves", node=proxy, exists=True):
+        setupNodes += cmds.listConnections(proxy + ".snapshotCurves", s=True, d=False) or []
 cmds.lockNode(temp_Group, l=False)
-cmds.delete(temp_Group)     
+cmds.delete(setupNodes)     
 
 
 """
@@ -847,24 +1754,26 @@ cmds.delete(temp_Group)
 
 #UI LOGIC
 def userInterface():
+    #IF THE WINDOW IS ALREADY BUILT, IT'S JUST BROUGHT BACK UP WITH THE SETTINGS IT HAD
     if cmds.window("IK_FK_Switcher", ex=True):
-        cmds.deleteUI("IK_FK_Switcher")
+        cmds.showWindow("IK_FK_Switcher")
+        return
         
 
-    cmds.window("IK_FK_Switcher", title="IK/FK Switcher, by Petar3D", wh=[360, 242], s=False)
-    cmds.formLayout("formLayout", numberOfDivisions=100, w=360, h=242)
+    cmds.window("IK_FK_Switcher", title="IK/FK Switcher, by Petar3D", wh=[360, 338], s=False)
+    cmds.formLayout("formLayout", numberOfDivisions=100, w=360, h=338)
 
 
-    cmds.button("fkToIK_Button", l="FK to IK", recomputeSize = True, bgc=[0.6220035095750363, 0.8836957351033798, 1.0], h = 43, w = 100,  parent ="formLayout", command="fk_To_IK()", 
-    ann="Applies a temporary IK setup on top of your existing FK chain.\nHow to use:  Select 3 FK controls, starting from the parent to the child, then click this button.")
+    cmds.button("fkToIK_Button", l="FK to IK", recomputeSize = True, bgc=[0.6220035095750363, 0.8836957351033798, 1.0], h = 43, w = 100,  parent ="formLayout", command=lambda *args: queueSwitch(fk_To_IK), 
+    ann="Applies a temporary IK setup on top of your existing FK chain.\nHow to use:  Select 3 or more FK controls, starting from the parent to the child, then click this button.")
     formLayout("fkToIK_Button", 11, 16)
-    cmds.button("ikToFK_Button", l="IK to FK ", recomputeSize = True, bgc=[1.0, 1.0, 0.6220035095750363], h = 43, w = 100,  parent ="formLayout", command="ik_To_FK()",
+    cmds.button("ikToFK_Button", l="IK to FK ", recomputeSize = True, bgc=[1.0, 1.0, 0.6220035095750363], h = 43, w = 100,  parent ="formLayout", command=lambda *args: queueSwitch(ik_To_FK),
     ann="Applies a temporary FK setup on top of your existing IK chain.\nHow to use:  Select the pole vector and then the IK control, then click this button.")
     formLayout("ikToFK_Button", 11, 131)
-    cmds.button("DeleteSetup_Button", l="Delete Setup", recomputeSize = True, bgc=[1.0, 0.6220035095750363, 0.6220035095750363], h = 43, w = 99,  parent ="formLayout", command="deleteSetup()",
+    cmds.button("DeleteSetup_Button", l="Delete Setup", recomputeSize = True, bgc=[1.0, 0.6220035095750363, 0.6220035095750363], h = 43, w = 99,  parent ="formLayout", command=lambda *args: queueSwitch(deleteSetup),
     ann="Deletes the temporary IK/FK setups and brings back the original.\nHow to use:  Select a control from the current setup, then click this button.")
     formLayout("DeleteSetup_Button", 11, 246)
-    cmds.button("ExtraOptions_Button", l="Extra Options", recomputeSize = True, bgc=[0.6220035095750363, 1.0, 0.6656137941557946], h = 34, w = 90,  parent ="formLayout", command = "extraOptions()")
+    cmds.button("ExtraOptions_Button", l="Extra Options", recomputeSize = True, bgc=[0.6220035095750363, 1.0, 0.6656137941557946], h = 34, w = 90,  parent ="formLayout", command=lambda *args: extraOptions())
     formLayout("ExtraOptions_Button", 200, 262)
     cmds.textFieldGrp("Settings_Button", l="Settings", bgc=[0.4429541466392004, 0.4429541466392004, 0.4429541466392004], cw=(1,91),h = 23, w = 145,  parent ="formLayout", ed=False)
     formLayout("Settings_Button", 75, 16)
@@ -881,10 +1790,35 @@ def userInterface():
     cmds.checkBoxGrp("HideOriginalControls_CheckBox", l="Hide Original Controls: ", ncb=1, l1="", cw = (1, 122), w = 171, vr=False, v1=True,  parent ="formLayout",
     ann="When applying your temporary setup, this hides the original controls, for more clarity")
     formLayout("HideOriginalControls_CheckBox", 175, 14)
+    cmds.checkBoxGrp("RunInBackground_CheckBox", l="Run In Background: ", ncb=1, l1="", cw = (1, 104), w = 125, vr=False,  parent ="formLayout",
+    ann="Bakes in small steps while Maya is idle, so you can keep working and follow the progress below.\nSwitches you start while one is baking get queued and run one after another.")
+    formLayout("RunInBackground_CheckBox", 151, 200)
+    cmds.checkBoxGrp("IsolateEvaluation_CheckBox", l="Isolate Evaluation: ", ncb=1, l1="", cw = (1, 104), w = 125, vr=False,  parent ="formLayout",
+    ann="During the bake, switches off the deformers, expressions and simulations that the baked controls don't depend on, like other characters in the shot.\nThey get switched back on as soon as the bake is done, and on referenced rigs the edit is taken back out of the reference.")
+    formLayout("IsolateEvaluation_CheckBox", 175, 200)
+    cmds.checkBoxGrp("MatrixConnections_CheckBox", l="Matrix Connections: ", ncb=1, l1="", cw = (1, 104), w = 125, vr=False,  parent ="formLayout",
+    ann="Drives the temp setups with matrix nodes instead of constraints, which evaluate faster and in parallel, so bakes and playback get quicker.\n"
+    "Only the temp controls and the original controls or joints without keys are converted. Original controls with keyed channels, which is most of them on an animated rig, still get regular constraints, so no animation gets overwritten.")
+    formLayout("MatrixConnections_CheckBox", 77, 200)
 
     cmds.floatFieldGrp("Intensity_FloatField", l="Intensity: ", numberOfFields=1, v1=1.0,  cw = (1, 52), w = 137, parent ="formLayout",
     ann="The higher the amount, the less keyframes you'll have when applying the key reducer,\nbut you lose out on how precisely the animation gets baked across.")
     formLayout("Intensity_FloatField", 125, 139)
+    cmds.checkBoxGrp("AutoKeyReducer_CheckBox", l="Auto: ", ncb=1, l1="", cw = (1, 32), w = 55, vr=False,  parent ="formLayout",
+    ann="Instead of using one intensity for everything, finds the strongest key reduction for every channel that keeps the pose within the error budget.")
+    formLayout("AutoKeyReducer_CheckBox", 128, 282)
+    cmds.checkBoxGrp("VerifyAccuracy_CheckBox", l="Verify Accuracy: ", ncb=1, l1="", cw = (1, 104), w = 125, vr=False,  parent ="formLayout",
+    ann="After every switch, compares the world position and rotation of the original controls across the timeline to how they were before the switch.\nFrames that are off by more than the tolerance get listed in the Script Editor.")
+    formLayout("VerifyAccuracy_CheckBox", 223, 14)
+    cmds.floatFieldGrp("Tolerance_FloatField", l="Tolerance: ", numberOfFields=1, v1=0.01, pre=4,  cw = (1, 58), w = 120, parent ="formLayout",
+    ann="The largest error allowed on a frame before it gets reported, in scene units for positions and in degrees for rotations.")
+    formLayout("Tolerance_FloatField", 221, 139)
+    cmds.floatFieldGrp("ErrorBudget_FloatField", l="Error Budget: ", numberOfFields=1, v1=0.05, pre=3,  cw = (1, 72), w = 137, parent ="formLayout",
+    ann="Used by the automatic key reducer. How far, in scene units, the reduced animation is allowed to drift from the baked one.\nRotations are measured by how far they move the rest of the chain.")
+    formLayout("ErrorBudget_FloatField", 245, 14)
+    cmds.checkBoxGrp("OutputToLayer_CheckBox", l="Output To Layer: ", ncb=1, l1="", cw = (1, 104), w = 125, vr=False,  parent ="formLayout",
+    ann="When deleting a setup with Preserve Animation on, the result goes into its own animation layer instead of being baked over the original curves.\nMute the layer to compare, merge it to keep the switch, or delete it to go back. All from the Extra Options.")
+    formLayout("OutputToLayer_CheckBox", 247, 200)
 
     cmds.floatSliderGrp("ControlSize_FloatSlider", l="Control Scale: ", field=True, minValue=1, maxValue=50, v=15, cw = (1, 74), w = 348, parent ="formLayout",
     ann="Once you create a temporary setup, use this slider to adjust the size of the controls that get created, if they appear too big or too small.")
@@ -893,21 +1827,32 @@ def userInterface():
     cmds.separator("Proxy_HRSeparator", hr=True,bgc=[0.6569924467841611, 0.6569924467841611, 0.6569924467841611], style="none", h = 3, w = 394)
     formLayout("Proxy_HRSeparator", 63, -8)
 
+    cmds.progressBar("Bake_ProgressBar", w = 240, h = 14, parent ="formLayout")
+    formLayout("Bake_ProgressBar", 291, 16)
+    cmds.text("BakeProgress_Text", l="", al="left", w = 240, parent ="formLayout")
+    formLayout("BakeProgress_Text", 309, 16)
+    cmds.button("CancelSwitch_Button", l="Cancel", recomputeSize = True, bgc=[0.8, 0.8, 0.8], h = 34, w = 90,  parent ="formLayout", command=lambda *args: cancelSwitch(), en=False,
+    ann="Stops the background bake, removes the setup that was being built and clears any queued switches.")
+    formLayout("CancelSwitch_Button", 291, 262)
+
     cmds.showWindow("IK_FK_Switcher")
     
 
 def extraOptions():
     if cmds.window("Extra_Options", ex=True):
         cmds.deleteUI("Extra_Options")
+    #THE SETUP INDEX IS HOOKED UP WHILE THE SETUP LIST IS OPEN, SO IMPORTING THE SCRIPT AND OPENING THE MAIN WINDOW STAY FREE OF SIDE EFFECTS
+    installSetupCallbacks()
     
-    cmds.window("Extra_Options", title="Extra Options", wh=[344, 242], s=False)
-    cmds.formLayout("formLayout", numberOfDivisions=100, w=343, h=240)
+    cmds.window("Extra_Options", title="Extra Options", wh=[344, 510], s=False, closeCommand=uninstallSetupCallbacks)
+    cmds.formLayout("formLayout", numberOfDivisions=100, w=343, h=508)
     
-    cmds.button("Generate_Code_Button", l="Generate Code", recomputeSize = True, bgc=[0.6220035095750363, 1.0, 0.7237659266041047], h = 44, w = 110,  parent ="formLayout", command="generateCode()",
+    cmds.button("Generate_Code_Button", l="Generate Code", recomputeSize = True, bgc=[0.6220035095750363, 1.0, 0.7237659266041047], h = 44, w = 110,  parent ="formLayout", command=lambda *args: generateCode(),
     ann="It isolates the code from the UI, so you can put it on a shelf or add it to a marking menu, and you don't have to come back to the UI every time.\nThere's 2 ways to use this.\n"
     "Specific setup:  If you select the controls in the scene as if you were applying the setup, when you hit generate it'll store the selection into the code, so you don't have to select them every time.\n"
     "General setup:  If you have nothing selected in the scene and hit generate, it'll produce a generic version of the code, and you'll have to select the controls every time before executing the code, but it's more flexible.\n"
-    "Important note:  Whatever values you have for the settings in the main window, those values will be stored within the code you generate.")
+    "Important note:  Whatever values you have for the settings in the main window, those values will be stored within the code you generate.\n"
+    "Chain length:  The generated code works on 3 joint chains only, 3 FK controls or an IK handle over 3 joints. For longer chains, use the buttons in the main window.")
     formLayout("Generate_Code_Button", 17, 16)
     
     cmds.radioButtonGrp("GenerateCodeOptions_RadioB", vr=True, numberOfRadioButtons = 3, en1=True, l1="FK to IK", l2="IK to FK", l3="Delete Setup", parent="formLayout")
@@ -917,7 +1862,36 @@ def extraOptions():
     cmds.scrollField("GenerateCodeOutputWindow", width=312, height=150)
     formLayout("GenerateCodeOutputWindow", 75, 16)
     
+    cmds.textScrollList("Setups_ScrollList", allowMultiSelection=True, width=312, height=100, parent="formLayout",
+    ann="Every temporary setup in the scene, with its original controls, bake range, keys and roughly how much memory it takes up.\nIt updates on its own as setups get created, deleted, undone, imported or referenced.")
+    formLayout("Setups_ScrollList", 240, 16)
+    cmds.button("BakeSelected_Button", l="Bake Selected", recomputeSize = True, bgc=[0.6220035095750363, 1.0, 0.7237659266041047], h = 28, w = 100,  parent ="formLayout", command=lambda *args: removeSelectedSetups(True),
+    ann="Deletes the setups picked in the list, baking their animation back onto the original controls.")
+    formLayout("BakeSelected_Button", 348, 16)
+    cmds.button("DeleteSelected_Button", l="Delete Selected", recomputeSize = True, bgc=[1.0, 0.6220035095750363, 0.6220035095750363], h = 28, w = 100,  parent ="formLayout", command=lambda *args: removeSelectedSetups(False),
+    ann="Deletes the setups picked in the list without baking, so the original controls get their animation from before the switch.")
+    formLayout("DeleteSelected_Button", 348, 122)
+    cmds.button("RefreshSetups_Button", l="Refresh", recomputeSize = True, bgc=[0.8, 0.8, 0.8], h = 28, w = 100,  parent ="formLayout", command=lambda *args: rebuildSetupIndex(),
+    ann="Scans the scene for setups again. The list normally keeps itself up to date, this is only needed if something went out of sync.")
+    formLayout("RefreshSetups_Button", 348, 228)
+    refreshSetupList()
+    
+    cmds.textScrollList("Layers_ScrollList", allowMultiSelection=True, width=312, height=80, parent="formLayout",
+    ann="The animation layers that deleted setups were written into.")
+    formLayout("Layers_ScrollList", 390, 16)
+    cmds.button("CommitLayer_Button", l="Commit", recomputeSize = True, bgc=[0.6220035095750363, 1.0, 0.7237659266041047], h = 28, w = 100,  parent ="formLayout", command=lambda *args: editSelectedLayers(commitLayer),
+    ann="Merges the layers picked in the list into the base animation, which makes the switch permanent.")
+    formLayout("CommitLayer_Button", 476, 16)
+    cmds.button("RevertLayer_Button", l="Revert", recomputeSize = True, bgc=[1.0, 0.6220035095750363, 0.6220035095750363], h = 28, w = 100,  parent ="formLayout", command=lambda *args: editSelectedLayers(revertLayer),
+    ann="Deletes the layers picked in the list, which brings back the animation from before the switch.")
+    formLayout("RevertLayer_Button", 476, 122)
+    cmds.button("ToggleLayer_Button", l="Mute / Unmute", recomputeSize = True, bgc=[0.8, 0.8, 0.8], h = 28, w = 100,  parent ="formLayout", command=lambda *args: editSelectedLayers(toggleLayer),
+    ann="Flips the layers picked in the list on or off, to compare the switched motion with the original.")
+    formLayout("ToggleLayer_Button", 476, 228)
+    refreshLayerList()
+    
     cmds.showWindow("Extra_Options")
 
-userInterface()
+if __name__ == "__main__":
+    userInterface()
 